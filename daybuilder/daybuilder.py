@@ -35,7 +35,10 @@ class DayBuilder(QWidget):
     def reload_page(self, page_number):
         if page_number == 1:
             self.stats.refresh()
-        elif page_number == 2:
+        else:
+            # The stats load in the background, no need to finish if they will not be seen
+            self.stats.cancel()
+        if page_number == 2:
             self.history.set_view()
 
 
@@ -51,9 +54,11 @@ def main(args):
         path = ["data", default_db]
     db = os.path.join(os.path.dirname(__file__), *path)
 
+    from daybuilder.utils import init_db
     if not os.path.exists(db):
-        from daybuilder.utils import init_db
         init_db.main(db)
+    else:
+        init_db.upgrade_db(db)
 
     app = QApplication([])
     daybuilder = DayBuilder(db)
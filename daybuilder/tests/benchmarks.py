@@ -0,0 +1,674 @@
+"""
+    Benchmarks for the slow paths in Day Builder.
+
+    Run one benchmark by name or leave the name off to run all of them:
+        python -m daybuilder.tests.benchmarks time_overlap
+"""
+from daybuilder.utils import db_interface as dbx, init_db
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from PyQt5.QtCore import QDate, QDateTime, QTime, Qt
+
+# Each fake item lasts an hour and they are spaced 90 minutes apart
+# so none of them overlap
+ROW_DURATION = 60
+ROW_SPACING = 90
+FIRST_START = datetime.datetime(2000, 1, 1)
+
+
+def make_database(num_rows):
+    """ Create a temporary database with num_rows schedule rows.
+        Returns the path to the database file. """
+    folder = tempfile.mkdtemp(prefix="daybuilder-bench-")
+    db = os.path.join(folder, "bench.db")
+    init_db.main(db)
+    with sqlite3.connect(db) as con:
+        task_id = dbx.insert_item(con, 0, "Task")
+        timeframe_id = dbx.insert_item(con, 1, "Timeframe")
+        rows = (
+            (
+                task_id if i % 2 else timeframe_id,
+                (FIRST_START + datetime.timedelta(minutes=i * ROW_SPACING)).isoformat(),
+                ROW_DURATION,
+                "",
+                0 if i % 2 else None,
+            )
+            for i in range(num_rows)
+        )
+        con.executemany(
+            "INSERT INTO schedule (item_id, start, duration, description, completed) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+    return db
+
+
+def timed(func, repeat):
+    """ Average number of seconds it takes to call func """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def legacy_time_overlap(con, item_type, start, duration):
+    """ The original time_overlap that parsed every row in the schedule """
+    con.row_factory = sqlite3.Row
+    sql = """SELECT item_type, start, duration FROM schedule
+             JOIN items on items.item_id = schedule.item_id"""
+    cur = con.cursor()
+    cur.execute(sql)
+    rows = cur.fetchall()
+
+    for row in rows:
+        row_qdatetime = QDateTime.fromString(row['start'], Qt.ISODate)
+        starts_before_ends = start < row_qdatetime.addSecs(row['duration'] * 60)
+        ends_after_starts = start.addSecs(duration * 60) > row_qdatetime
+        if (item_type == row['item_type']) and starts_before_ends and ends_after_starts:
+           return True
+    return False
+
+
+def bench_time_overlap():
+    print("time_overlap: full scan vs. schedule_start index")
+    for num_rows in (10_000, 100_000, 1_000_000):
+        db = make_database(num_rows)
+        # Check a time in the middle of the schedule so the full scan
+        # has to look at every row before it finds nothing
+        middle = FIRST_START + datetime.timedelta(minutes=(num_rows // 2) * ROW_SPACING + ROW_DURATION)
+        start = QDateTime.fromString(middle.isoformat(), Qt.ISODate)
+        with sqlite3.connect(db) as con:
+            assert not dbx.time_overlap(con, 0, start, 15)
+            assert not legacy_time_overlap(con, 0, start, 15)
+            legacy = timed(lambda: legacy_time_overlap(con, 0, start, 15), 3)
+            indexed = timed(lambda: dbx.time_overlap(con, 0, start, 15), 1000)
+        print(f"  {num_rows:>9} rows: scan {legacy * 1000:10.3f} ms"
+              f"  indexed {indexed * 1000:8.3f} ms  ({legacy / indexed:,.0f}x)")
+
+
+def random_plans(num_days, plans_per_day=15, seed=0):
+    """ Plans like the ones made by randomize_schedule.py """
+    rng = random.Random(seed)
+    names = {0: ("Cook", "Chores", "Exercise", "Read", "Study", "Walk Dog"), 1: ("Morning", "Night", "Free Time")}
+    day = QDate(2019, 1, 1)
+    plans = []
+    for _ in range(num_days):
+        day = day.addDays(1)
+        for __ in range(plans_per_day):
+            item_type = int(rng.random() < 1 / 8)
+            start = QDateTime(day, QTime(rng.randint(0, 20), rng.randint(0, 59)))
+            duration = rng.randint(0, 180)
+            plans.append((item_type, rng.choice(names[item_type]), ["random"], "", start, duration))
+    return plans
+
+
+def bench_bulk_insert():
+    print("Scheduling plans: create_schedule_item loop vs. create_schedule_items")
+    for num_days in (365, 365 * 5):
+        plans = random_plans(num_days)
+
+        db = make_database(0)
+        start = time.perf_counter()
+        with sqlite3.connect(db) as con:
+            for plan in plans:
+                try:
+                    dbx.create_schedule_item(con, *plan)
+                except dbx.TimeOverlapError:
+                    pass
+        looped = time.perf_counter() - start
+
+        db = make_database(0)
+        start = time.perf_counter()
+        with sqlite3.connect(db) as con:
+            rejected = dbx.create_schedule_items(con, plans)
+        bulk = time.perf_counter() - start
+        print(f"  {len(plans):>7} plans: loop {looped:8.3f} s  bulk {bulk:8.3f} s"
+              f"  ({len(rejected)} rejected)")
+
+
+def legacy_load_items(con):
+    """ The original stats loader that built the frame from sqlite3.Row objects """
+    import pandas as pd
+    con.row_factory = sqlite3.Row
+    schedule_rows = dbx.get_schedule_for_stats(con)
+    column_names = schedule_rows[0].keys()
+    items = pd.DataFrame(schedule_rows, columns=column_names).astype({"start": "datetime64[ns]"})
+    completion_dict = {"NaN": None, 0: False, 1: True}
+    items["completed"] = items["completed"].map(completion_dict)
+    return items
+
+
+def measure(func):
+    """ Seconds and peak bytes allocated while calling func.
+        tracemalloc slows everything down so they are measured in separate calls """
+    elapsed = timed(func, 1)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_stats_loader():
+    from daybuilder.utils import stats
+    print("Loading the schedule for stats: sqlite3.Row -> DataFrame vs. batches -> numpy")
+    for num_rows in (10_000, 100_000, 1_000_000):
+        db = make_database(num_rows)
+        with sqlite3.connect(db) as con:
+            legacy_time, legacy_peak = measure(lambda: legacy_load_items(con))
+            con.row_factory = None
+            arrays_time, arrays_peak = measure(
+                lambda: stats.load_items_dataframe(stats.load_item_arrays(con)))
+        print(f"  {num_rows:>9} rows: rows {legacy_time:7.3f} s {legacy_peak / 2**20:8.1f} MiB"
+              f"  arrays {arrays_time:7.3f} s {arrays_peak / 2**20:8.1f} MiB")
+
+
+def bench_trends():
+    from daybuilder.utils import stats
+    print("Rolling rates and streaks from dense per-day arrays")
+    for years in (1, 10):
+        plans = [plan + (random.randint(0, 1),) for plan in random_plans(365 * years)]
+        db = make_database(0)
+        with sqlite3.connect(db) as con:
+            dbx.create_schedule_items(con, plans)
+            for day in range(365 * years):
+                dbx.insert_rating_row(con, QDate(2019, 1, 2).addDays(day), random.randint(0, 4))
+        with sqlite3.connect(db) as con:
+            con.row_factory = None
+            item_arrays = stats.load_item_arrays(con)
+            rating_arrays = stats.load_rating_arrays(con)
+        elapsed = timed(lambda: stats.build_trends(item_arrays, rating_arrays), 10)
+        print(f"  {years:>2} years ({len(item_arrays['start'])} rows): {elapsed * 1000:8.3f} ms")
+
+
+def legacy_nest(intervals):
+    """ The original nesting: look through every timeframe for every task """
+    from daybuilder.utils import layout
+    placements = []
+    children = {}
+    timeframes = [interval for interval in intervals if interval.item_type == layout.TIMEFRAME]
+    for interval in sorted(intervals, key=layout.sort_key):
+        parent = None
+        if interval.item_type == layout.TASK:
+            for timeframe in timeframes:
+                if layout.contains(timeframe, interval) and (parent is None or layout.contains(parent, timeframe)):
+                    parent = timeframe
+        if parent is None:
+            children[interval.key] = []
+            placements.append(layout.Placement(interval.key, children[interval.key]))
+        else:
+            children[parent.key].append(interval.key)
+    return placements
+
+
+def bench_nesting():
+    from daybuilder.utils import layout
+    print("Nesting tasks in timeframes: every task against every timeframe vs. sweep line")
+    rng = random.Random(0)
+    for num_items in (100, 1000, 10_000):
+        # One timeframe for every 10 items, back to back, and tasks anywhere
+        num_timeframes = num_items // 10
+        length = 60
+        intervals = [layout.Interval(i, layout.TIMEFRAME, i * length, (i + 1) * length) for i in range(num_timeframes)]
+        for key in range(num_timeframes, num_items):
+            start = rng.randrange(num_timeframes * length)
+            intervals.append(layout.Interval(key, layout.TASK, start, start + rng.randint(1, 30)))
+        assert legacy_nest(intervals) == layout.nest(intervals)
+        legacy = timed(lambda: legacy_nest(intervals), 1)
+        sweep = timed(lambda: layout.nest(intervals), 10)
+        print(f"  {num_items:>6} items: nested loop {legacy * 1000:10.3f} ms  sweep {sweep * 1000:8.3f} ms"
+              f"  ({legacy / sweep:,.0f}x)")
+
+
+def bench_schedule_area():
+    # Runs without a window
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QCoreApplication, QEvent
+    from PyQt5.QtWidgets import QApplication
+    from daybuilder.widgets import dailyplanner
+    app = QApplication.instance() or QApplication([])
+
+    # The most items a day can have before it is shown in a ScheduleList
+    num_items = dailyplanner.DENSE_DAY
+    print(f"Updating one item out of {num_items}: rebuild the day vs. change one widget")
+    db = make_database(0)
+    day = QDate(2020, 1, 1)
+    midnight = QDateTime(day, QTime(0, 0))
+    # 5 minute tasks every 7 minutes do not overlap
+    plans = [(0, f"Task {i}", [], "", midnight.addSecs(i * 7 * 60), 5, 0) for i in range(num_items)]
+    with sqlite3.connect(db) as con:
+        dbx.create_schedule_items(con, plans)
+    area = dailyplanner.ScheduleArea(db)
+    area.refresh(day)
+
+    def settle():
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        app.processEvents()
+
+    def rebuild():
+        area.clear_view()
+        area.load_schedule()
+        area.display_items()
+
+    def write(args):
+        with area.connections.writer() as con:
+            dbx.update_schedule_item(con, *args)
+
+    first_id = min(area.items)
+    first_start = QDateTime.fromString(area.rows[first_id]["start"], Qt.ISODate)
+    late_start = QDateTime(day, QTime(23, 30))
+    edits = {
+        "description": lambda n: (first_id, None, None, f"Edit {n}", first_start, 5, 0),
+        "move": lambda n: (first_id, None, None, "", late_start if n % 2 else first_start, 5, 0),
+    }
+    for name, make_args in edits.items():
+        counter = iter(range(10**9))
+
+        def full():
+            write(make_args(next(counter)))
+            rebuild()
+            settle()
+
+        def diff():
+            area.update_item(make_args(next(counter)))
+            settle()
+
+        full_time = timed(full, 20)
+        diff_time = timed(diff, 20)
+        print(f"  {name:>11}: rebuild {full_time * 1000:8.3f} ms  diff {diff_time * 1000:8.3f} ms"
+              f"  ({full_time / diff_time:,.0f}x)")
+
+
+def bench_paging():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QCoreApplication, QEvent
+    from PyQt5.QtWidgets import QApplication
+    from daybuilder.widgets import dailyplanner
+    app = QApplication.instance() or QApplication([])
+
+    num_days = 30
+    print(f"Paging through {num_days} days: new widgets vs. ItemPool")
+    db = make_database(0)
+    with sqlite3.connect(db) as con:
+        dbx.create_schedule_items(con, random_plans(num_days, plans_per_day=20))
+    first_day = QDate(2019, 1, 2)
+    for pool_size in (0, dailyplanner.scheduleitem.POOL_SIZE):
+        area = dailyplanner.ScheduleArea(db)
+        area.pool.max_size = pool_size
+
+        def page():
+            for day in range(num_days):
+                area.refresh(first_day.addDays(day))
+                QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+                app.processEvents()
+
+        elapsed = timed(page, 3)
+        stats = area.pool.stats()
+        print(f"  pool size {pool_size:>3}: {elapsed / num_days * 1000:8.3f} ms per day"
+              f"  ({stats['hits']} hits, {stats['misses']} misses)")
+
+
+def bench_completion():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QCoreApplication, QEvent
+    from PyQt5.QtWidgets import QApplication
+    from daybuilder.widgets import dailyplanner
+    app = QApplication.instance() or QApplication([])
+
+    num_items = dailyplanner.DENSE_DAY
+    print(f"Checking off one task out of {num_items}: full update vs. set_completed")
+    db = make_database(0)
+    day = QDate(2020, 1, 1)
+    midnight = QDateTime(day, QTime(0, 0))
+    plans = [(0, f"Task {i}", ["tag"], "", midnight.addSecs(i * 7 * 60), 5, 0) for i in range(num_items)]
+    with sqlite3.connect(db) as con:
+        dbx.create_schedule_items(con, plans)
+    area = dailyplanner.ScheduleArea(db)
+    area.refresh(day)
+    task = area.items[min(area.items)]
+    counter = iter(range(10**9))
+
+    def settle():
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        app.processEvents()
+
+    def full():
+        # What Task.marked_complete used to do
+        task.completed = next(counter) % 2 == 0
+        task.save_changes()
+        settle()
+
+    def toggle():
+        task.name_label.click()
+        settle()
+
+    full_time = timed(full, 50)
+    toggle_time = timed(toggle, 50)
+    print(f"  full update {full_time * 1000:8.3f} ms  set_completed {toggle_time * 1000:8.3f} ms"
+          f"  ({full_time / toggle_time:,.1f}x)")
+
+
+def bench_day_cache():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QCoreApplication, QEvent
+    from PyQt5.QtWidgets import QApplication
+    from daybuilder.widgets import dailyplanner
+    app = QApplication.instance() or QApplication([])
+
+    num_days = 7
+    print(f"Skimming forward {num_days} days: reading each day vs. DayCache with prefetch")
+    db = make_database(0)
+    with sqlite3.connect(db) as con:
+        dbx.create_schedule_items(con, random_plans(4 * num_days, plans_per_day=20))
+    first_day = QDate(2019, 1, 2)
+    planner = dailyplanner.DailyPlanner(db)
+    cache = planner.day_cache
+    read_time = [0.0]
+    get = cache.get
+
+    def timed_get(day):
+        start = time.perf_counter()
+        try:
+            return get(day)
+        finally:
+            read_time[0] += time.perf_counter() - start
+
+    cache.get = timed_get
+    for max_size in (0, cache.max_size):
+        cache.max_size = max_size
+        cache.invalidate(*(first_day.addDays(day) for day in range(-1, 2 * num_days)))
+        planner.date_changed(first_day)
+        cache.pool.waitForDone()
+        cache.hits = cache.misses = read_time[0] = 0
+
+        def skim():
+            for day in range(1, num_days + 1):
+                planner.date_changed(first_day.addDays(day))
+                QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+                app.processEvents()
+
+        elapsed = timed(skim, 1)
+        stats = cache.stats()
+        print(f"  cache size {max_size:>2}: {elapsed / num_days * 1000:8.3f} ms per day,"
+              f" {read_time[0] / num_days * 1000:6.3f} ms waiting on reads"
+              f"  ({stats['hits']} hits, {stats['misses']} misses)")
+        cache.pool.waitForDone()
+
+
+def bench_dense_day():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from daybuilder.widgets import dailyplanner
+    app = QApplication.instance() or QApplication([])
+
+    num_items = 500
+    print(f"Showing and scrolling a day with {num_items} items: widgets vs. ScheduleList")
+    db = make_database(0)
+    day = QDate(2020, 1, 1)
+    midnight = QDateTime(day, QTime(0, 0))
+    plans = [(0, f"Task {i}", [], "", midnight.addSecs(i * 2 * 60), 1, 0) for i in range(num_items)]
+    with sqlite3.connect(db) as con:
+        dbx.create_schedule_items(con, plans)
+    for dense_day in (num_items, dailyplanner.DENSE_DAY):
+        dailyplanner.DENSE_DAY = dense_day
+        area = dailyplanner.ScheduleArea(db)
+        area.resize(600, 800)
+        area.show()
+
+        def show():
+            area.refresh(day.addDays(1))
+            area.refresh(day)
+            app.processEvents()
+
+        def scroll():
+            scroll_bar = (area.schedule_list if area.dense else area.scroll_area).verticalScrollBar()
+            for value in range(0, scroll_bar.maximum(), scroll_bar.pageStep()):
+                scroll_bar.setValue(value)
+                app.processEvents()
+
+        shown = timed(show, 3)
+        scrolled = timed(scroll, 3)
+        label = "ScheduleList" if area.dense else "widgets"
+        print(f"  {label:>12}: {shown * 1000:8.3f} ms to show, {scrolled * 1000:8.3f} ms to scroll through")
+        area.close()
+
+
+def bench_icons():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from daybuilder.utils import util
+    from daybuilder.widgets import scheduleitem
+    app = QApplication.instance() or QApplication([])
+
+    num_items = 200
+    print(f"Building {num_items} ScheduleItems: looking icons up every time vs. the shared icons")
+    db = make_database(0)
+    day = QDate(2020, 1, 1)
+    with sqlite3.connect(db) as con:
+        active_id = dbx.create_schedule_item(con, 0, "Task", [], "", QDateTime(day, QTime(9, 0)), 30)
+        con.row_factory = sqlite3.Row
+        row = dbx.get_schedule_item(con, active_id)
+
+    def build(clear):
+        def func():
+            for _ in range(num_items):
+                if clear:
+                    util._icons.clear()
+                scheduleitem.create_schedule_item(row).deleteLater()
+        return func
+
+    icon_names = ("edit", "save", "cancel", "delete")
+
+    def lookups(clear):
+        def func():
+            for _ in range(num_items):
+                if clear:
+                    util._icons.clear()
+                for name in icon_names:
+                    util.icon(name)
+        return func
+
+    for label, clear in (("every time", True), ("shared", False)):
+        lookup_time = timed(lookups(clear), 3)
+        build_time = timed(build(clear), 3)
+        app.processEvents()
+        print(f"  {label:>10}: icons {lookup_time / num_items * 1000:7.3f} ms per item,"
+              f" whole item {build_time / num_items * 1000:7.3f} ms")
+
+
+def bench_templates():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from daybuilder.widgets import dailyplanner
+    app = QApplication.instance() or QApplication([])
+
+    num_items = 3000
+    print(f"Quick Reuse with {num_items} items: sort and scan everything vs. ItemIndex")
+    rng = random.Random(0)
+    words = ("Cook", "Chores", "Exercise", "Read", "Study", "Walk Dog", "Call", "Garden", "Piano", "Email")
+    db = make_database(0)
+    plans = []
+    for i in range(num_items):
+        start = QDateTime(FIRST_START.date(), QTime(0, 0)).addDays(rng.randint(0, 365))
+        plans.append((i % 2, f"{rng.choice(words)} {rng.choice(words)} {i}", [], "", start, 0))
+    with sqlite3.connect(db) as con:
+        dbx.create_schedule_items(con, plans)
+    planner = dailyplanner.Planner(db)
+    planner.resize(400, 800)
+    planner.show()
+    planner.sortby_count.setChecked(True)
+    planner.display_templates()
+    templates = list(planner.template_lookup.values())
+    counter = iter(range(10**9))
+
+    def legacy_append():
+        # What display_templates did for every new button
+        template = rng.choice(templates)
+        planner.index.used(template.item_type, template.text(), f"2001-01-01T{next(counter) % 24:02}:00:00")
+        for template in sorted(templates, key=lambda t: t.item().count, reverse=True):
+            planner.template_map[template.item_type].addWidget(template)
+
+    def append():
+        template = rng.choice(templates)
+        start = f"2001-01-01T{next(counter) % 24:02}:00:00"
+        planner.index.used(template.item_type, template.text(), start)
+        planner.place_template(template)
+
+    def legacy_type():
+        for length in range(1, 5):
+            text = "cook"[:length]
+            for template in templates:
+                template.setVisible(text in template.text().casefold())
+            app.processEvents()
+        for template in templates:
+            template.show()
+        app.processEvents()
+
+    def type_text():
+        for length in range(1, 5):
+            planner.template_filter.setText("cook"[:length])
+            app.processEvents()
+        planner.template_filter.setText("")
+        app.processEvents()
+
+    for label, legacy, func in (("use", legacy_append, append), ("type", legacy_type, type_text)):
+        legacy_time = timed(legacy, 5)
+        index_time = timed(func, 5)
+        app.processEvents()
+        print(f"  {label:>4}: sort and scan {legacy_time * 1000:8.3f} ms  ItemIndex {index_time * 1000:8.3f} ms"
+              f"  ({legacy_time / index_time:,.0f}x)")
+
+
+def legacy_suggest(con, text, item_type, limit=10):
+    """ Ask the database for suggestions on every keystroke """
+    sql = """SELECT item_name FROM items
+             LEFT JOIN templates ON templates.item_id = items.item_id
+             WHERE item_type = ? AND item_name LIKE ?
+             ORDER BY coalesce(use_count, 0) DESC, last_used DESC
+             LIMIT ?"""
+    cur = con.cursor()
+    cur.execute(sql, (item_type, f"%{text}%", limit))
+    return [row[0] for row in cur.fetchall()]
+
+
+def bench_name_completer():
+    from daybuilder.utils import item_index
+
+    num_items = 50000
+    print(f"Name suggestions out of {num_items} items: query per keystroke vs. ItemIndex")
+    rng = random.Random(0)
+    words = ("Cook", "Chores", "Exercise", "Read", "Study", "Walk Dog", "Call", "Garden", "Piano", "Email")
+    db = make_database(0)
+    with sqlite3.connect(db) as con:
+        for i in range(num_items):
+            dbx.insert_item(con, i % 2, f"{rng.choice(words)} {rng.choice(words)} {i}")
+        dbx.create_schedule_items(con, random_plans(365))
+        con.row_factory = sqlite3.Row
+        start = time.perf_counter()
+        index = item_index.ItemIndex()
+        index.load(dbx.get_item_uses(con))
+        print(f"  loading the index: {(time.perf_counter() - start) * 1000:8.3f} ms")
+        start = time.perf_counter()
+        index.build_trigrams()
+        print(f"  indexing trigrams: {(time.perf_counter() - start) * 1000:8.3f} ms")
+        typed = "walk dog 12"
+        # The last two match nothing, so suggest cannot stop early
+        for text in [typed[:length] for length in (1, 3, 6, len(typed))] + ["q", "zz"]:
+            query_time = timed(lambda: legacy_suggest(con, text, 0), 20)
+            index_time = timed(lambda: index.suggest(text, 0), 20)
+            print(f"  {text!r:>14}: query {query_time * 1000:8.3f} ms  ItemIndex {index_time * 1000:8.3f} ms")
+
+
+def bench_history():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from calendar import monthrange
+    from PyQt5.QtWidgets import QApplication, QGridLayout, QLabel, QVBoxLayout, QWidget
+    from daybuilder.utils import util
+    from daybuilder.widgets import history_view
+    app = QApplication.instance() or QApplication([])
+
+    num_flips = 20
+    print(f"Flipping between two months {num_flips} times: new blocks vs. cached periods and reused blocks")
+    rng = random.Random(0)
+    db = make_database(0)
+    first_day = QDate(2019, 1, 2)
+    with sqlite3.connect(db) as con:
+        dbx.create_schedule_items(con, random_plans(90))
+        for day in range(90):
+            dbx.insert_rating_row(con, first_day.addDays(day), rng.randint(1, 5))
+    view = history_view.HistoryView(db)
+    view.resize(1000, 700)
+    view.show()
+    view.view_selection.setCurrentText("Monthly")
+    months = (QDate(2019, 2, 1), QDate(2019, 3, 1))
+
+    legacy_view = QWidget()
+    legacy_layout = QGridLayout(legacy_view)
+    legacy_view.resize(1000, 700)
+    legacy_view.show()
+
+    def legacy_page(start_day):
+        # What HistoryView.load_blocks did before the blocks were reused
+        for i in reversed(range(legacy_layout.count())):
+            legacy_layout.itemAt(i).widget().setParent(None)
+        num_days = monthrange(start_day.year(), start_day.month())[1]
+        con = view.connections.reader()
+        summaries = {row["day"]: row for row in dbx.get_daily_summaries(con, start_day, start_day.addDays(num_days - 1))}
+        for count in range(num_days):
+            day = start_day.addDays(count)
+            summary = summaries.get(day.toString(Qt.ISODate))
+            block = QWidget()
+            block_vbox = QVBoxLayout(block)
+            block_vbox.addWidget(QLabel(day.toString(history_view.BLOCK_DATE_FORMAT)))
+            block_vbox.addWidget(QLabel(f"{summary['completed_tasks'] if summary else 0}"))
+            block.setStyleSheet(f"background-color: {util.rating_color_map[summary['rating'] if summary else None]}")
+            column = count + start_day.dayOfWeek() % 7
+            legacy_layout.addWidget(block, column // 7 + 1, column % 7)
+        app.processEvents()
+
+    def legacy():
+        for flip in range(num_flips):
+            legacy_page(months[flip % 2])
+
+    def cached():
+        for flip in range(num_flips):
+            view.date_entry.setDate(months[flip % 2])
+            app.processEvents()
+
+    legacy_time = timed(legacy, 1)
+    cached_time = timed(cached, 1)
+    print(f"  new blocks {legacy_time / num_flips * 1000:8.3f} ms per flip"
+          f"  cached {cached_time / num_flips * 1000:8.3f} ms per flip  ({legacy_time / cached_time:,.1f}x)")
+
+
+BENCHMARKS = {
+    "time_overlap": bench_time_overlap,
+    "icons": bench_icons,
+    "bulk_insert": bench_bulk_insert,
+    "stats_loader": bench_stats_loader,
+    "trends": bench_trends,
+    "nesting": bench_nesting,
+    "schedule_area": bench_schedule_area,
+    "paging": bench_paging,
+    "templates": bench_templates,
+    "name_completer": bench_name_completer,
+    "history": bench_history,
+    "completion": bench_completion,
+    "day_cache": bench_day_cache,
+    "dense_day": bench_dense_day,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
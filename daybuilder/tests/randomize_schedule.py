@@ -6,6 +6,7 @@ import sys
 import sqlite3
 from calendar import monthrange
 import time
+from PyQt5.QtCore import QDate, QDateTime, QTime
 
 if len(sys.argv) > 1:
     filename = sys.argv[1]
@@ -29,10 +30,11 @@ timeframes = ("Morning", "Night", "Afternoon", "Free Time")
 
 # Start at Jan 1st, 2019 and generate random data each day for two years
 day = datetime.date(2019, 1, 1)
+plans = []
+ratings = []
 for _ in range(365 * 2):
     day = day + datetime.timedelta(days=1)
     # Make a random number of plans for this day, max is 15
-    plans = []
     rating = random.randint(0, 5)
     for __ in range(15):
         item_type = not (bool(random.getrandbits(3))) # 1/8 chance to be True
@@ -47,21 +49,23 @@ for _ in range(365 * 2):
             start_time = datetime.time(random.randint(0, 20), random.randint(0, 59))
             duration = random.randint(0, 180)
         description = "".join(random.choice(tasks) for _ in range(0, 8))
-        start = datetime.datetime.combine(day, start_time)
-        plans.append((item_type, item_name, tags, description, start, duration))
-    with sqlite3.connect(database_file) as con:
-        for plan in plans:
-            try:
-                activeid = dbx.create_schedule_item(con, *plan)
-                # 50% chance to mark task as completed
-                completed = (random.randint(0, 10) > 3 )
-                if plan[0] == 0 and completed:
-                    dbx.mark_task_complete(con, activeid, True)
-            except dbx.TimeOverlapError:
-                pass
-        # Rate day randomly
-        if rating:
-            dbx.insert_rating_row(con, day, rating)
+        start = QDateTime(QDate(day.year, day.month, day.day), QTime(start_time.hour, start_time.minute))
+        if item_type:
+            completed = None
+        else:
+            # 50% chance to mark task as completed
+            completed = int(random.randint(0, 10) > 3)
+        plans.append((int(item_type), item_name, tags, description, start, duration, completed))
+    # Rate day randomly
+    if rating:
+        ratings.append((QDate(day.year, day.month, day.day), rating))
+
+# Insert everything in one transaction, plans that overlap are skipped
+with sqlite3.connect(database_file) as con:
+    rejected = dbx.create_schedule_items(con, plans)
+    for rating_day, rating in ratings:
+        dbx.insert_rating_row(con, rating_day, rating)
+print(f"{len(plans) - len(rejected)} plans scheduled, {len(rejected)} skipped because of overlaps")
 
 elapsed = time.time_ns() - start_ns
 print("Done.")
@@ -0,0 +1,163 @@
+"""
+    Module that keeps the schedule rows and rating of recently viewed days
+    in memory so paging through the DailyPlanner does not wait on the disk.
+
+    After the DailyPlanner changes pages it asks the DayCache to prefetch
+    the days around the new one. They are read on a background thread,
+    so by the time the user clicks the arrow again the next day is
+    usually already here.
+
+    Anything that writes to a day has to call invalidate (or invalidate_rows)
+    with that day after the writer() block commits. Each day has a
+    generation number that invalidate increases, and a prefetch only
+    keeps what it read if the generation did not change while it was
+    reading, so a write can never be covered up by a read that started
+    before it.
+"""
+from collections import OrderedDict, namedtuple
+import logging
+import threading
+
+from PyQt5.QtCore import QDate, QRunnable, QThreadPool, Qt
+
+from daybuilder.utils import db_connection, db_interface
+
+logger = logging.getLogger(__name__)
+
+# Number of days kept in memory
+CACHE_SIZE = 32
+# Number of days before and after the current one that are prefetched.
+# Holding an arrow down skims a week before the prefetch has to catch up.
+PREFETCH_DAYS = 7
+
+# rows are from db_interface.get_schedule_by_date, rating is None if the day is not rated
+Day = namedtuple("Day", ["rows", "rating"])
+
+
+def read_day(con, day):
+    return Day(db_interface.get_schedule_by_date(con, day), db_interface.get_rating_by_date(con, day))
+
+
+class PrefetchWorker(QRunnable):
+    """ Reads a list of days into a DayCache on a QThreadPool thread """
+
+    def __init__(self, cache, days):
+        super(PrefetchWorker, self).__init__()
+        self.cache = cache
+        self.days = days
+
+    def run(self):
+        con = self.cache.connections.reader()
+        try:
+            for day in self.days:
+                generation = self.cache.generation(day)
+                try:
+                    data = read_day(con, day)
+                except Exception:
+                    logger.exception("Could not prefetch %s", day.toString(Qt.ISODate))
+                    data = None
+                self.cache.store(day, data, generation)
+        finally:
+            # The pool retires idle threads, which would leave this connection open
+            self.cache.connections.release_reader()
+
+
+class DayCache:
+    """
+        LRU cache of Days keyed by ISO date.
+        get is called from the GUI thread, the PrefetchWorker calls store
+        from its own thread, so everything that touches the cache holds _lock.
+    """
+
+    def __init__(self, database, max_size=CACHE_SIZE):
+        self.database = database
+        self.connections = db_connection.get_manager(database)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._days = OrderedDict()
+        # ISO date: number of times it has been invalidated
+        self._generations = {}
+        # ISO dates a PrefetchWorker is going to read
+        self._loading = set()
+        self._lock = threading.Lock()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+
+    def generation(self, day):
+        with self._lock:
+            return self._generations.get(day.toString(Qt.ISODate), 0)
+
+    def _put(self, key, data):
+        self._days[key] = data
+        self._days.move_to_end(key)
+        while len(self._days) > self.max_size:
+            self._days.popitem(last=False)
+
+    def store(self, day, data, generation):
+        """ Keep data read for day, unless the day was written to since generation """
+        key = day.toString(Qt.ISODate)
+        with self._lock:
+            self._loading.discard(key)
+            if data is not None and self._generations.get(key, 0) == generation:
+                self._put(key, data)
+
+    def get(self, day):
+        """ The Day for a QDate, read on this thread if it is not cached """
+        key = day.toString(Qt.ISODate)
+        with self._lock:
+            data = self._days.get(key)
+            if data is not None:
+                self._days.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+            generation = self._generations.get(key, 0)
+        data = read_day(self.connections.reader(), day)
+        self.store(day, data, generation)
+        return data
+
+    def prefetch(self, day, radius=PREFETCH_DAYS):
+        """ Read the days around day in the background, closest first """
+        days = []
+        with self._lock:
+            for offset in range(1, radius + 1):
+                for neighbour in (day.addDays(offset), day.addDays(-offset)):
+                    key = neighbour.toString(Qt.ISODate)
+                    if key in self._days:
+                        # Still close by, so keep it from being pushed out
+                        self._days.move_to_end(key)
+                    elif key not in self._loading:
+                        self._loading.add(key)
+                        days.append(neighbour)
+        if days:
+            self.pool.start(PrefetchWorker(self, days))
+
+    def invalidate(self, *days):
+        """ Forget the Days for the given QDates, call after a write to them is committed """
+        with self._lock:
+            for day in days:
+                key = day.toString(Qt.ISODate)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._days.pop(key, None)
+
+    def invalidate_rows(self, *rows):
+        """ invalidate the days of schedule rows, rows that are None are skipped """
+        self.invalidate(*(QDate.fromString(row['start'][:10], Qt.ISODate) for row in rows if row is not None))
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._days)}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(database):
+    """ Get the DayCache for a database file, creating it the first time """
+    with _caches_lock:
+        cache = _caches.get(database)
+        if cache is None:
+            cache = DayCache(database)
+            _caches[database] = cache
+        return cache
@@ -0,0 +1,204 @@
+"""
+    Module that keeps connections to the database open for as long
+    as the program runs.
+    Widgets used to call sqlite3.connect every time they read or wrote
+    anything, which meant opening the file and reading the schema again
+    on every click.
+    Now they ask for the manager of their database and use its reader
+    and writer connections instead.
+"""
+# db_connection.py
+from contextlib import contextmanager
+import logging
+import sqlite3
+import threading
+import time
+
+from daybuilder.utils import init_db
+
+logger = logging.getLogger(__name__)
+
+# Run on every new connection
+PRAGMAS = (
+    # WAL lets the reader connections see committed data while the
+    # writer connection is busy
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# User defined functions registered on every new connection
+# name: (number of arguments, function)
+FUNCTIONS = {
+    "time_overlap": (6, init_db.time_overlap),
+}
+
+
+class CountingCursor(sqlite3.Cursor):
+    """ Cursor that adds the time it spends in SQLite to its manager's counters """
+
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            self.connection.manager.record(start, queries=1)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            self.connection.manager.record(start, queries=1)
+
+    def executescript(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executescript(*args)
+        finally:
+            self.connection.manager.record(start, queries=1)
+
+    # SQLite does most of the work for a query while the rows are being fetched
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self.connection.manager.record(start)
+
+    def fetchmany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            self.connection.manager.record(start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self.connection.manager.record(start)
+
+
+class ManagedConnection(sqlite3.Connection):
+    """ Connection whose cursors report to a ConnectionManager """
+    manager = None
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+    # The shortcut methods on sqlite3.Connection skip the cursor's methods
+    # so they have to go through cursor() explicitly to be counted
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+
+class ConnectionManager:
+    """
+        Holds the connections to one database.
+
+        reader() returns a connection for SELECT statements. Each thread
+        gets its own because sqlite3 connections can not be shared between
+        threads, but the connection is opened once and kept.
+        Threads from a pool should call release_reader() when their work is
+        done, since the pool can retire the thread and start another one.
+
+        writer() is a context manager around the single connection used to
+        change the database. The changes are committed when the with block
+        ends or rolled back if it raises.
+
+        Every connection is set up with sqlite3.Row as the row_factory,
+        the PRAGMAS and the FUNCTIONS above.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.counters = {"opens": 0, "queries": 0, "seconds": 0.0}
+        self._counter_lock = threading.Lock()
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connect(self):
+        start = time.perf_counter()
+        con = sqlite3.connect(self.db, factory=ManagedConnection, check_same_thread=False)
+        con.manager = self
+        con.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            con.execute(pragma)
+        for name, (num_args, func) in FUNCTIONS.items():
+            con.create_function(name, num_args, func)
+        with self._connections_lock:
+            self._connections.append(con)
+        self.record(start, opens=1)
+        logger.debug("Opened connection %d to %s", self.counters["opens"], self.db)
+        return con
+
+    def record(self, start, opens=0, queries=0):
+        """ Add the time since start (from time.perf_counter) to the counters """
+        elapsed = time.perf_counter() - start
+        with self._counter_lock:
+            self.counters["opens"] += opens
+            self.counters["queries"] += queries
+            self.counters["seconds"] += elapsed
+
+    def stats(self):
+        """ Copy of the counters: number of opens, number of queries and seconds spent """
+        with self._counter_lock:
+            return dict(self.counters)
+
+    def reader(self):
+        con = getattr(self._local, "reader", None)
+        if con is None:
+            con = self._connect()
+            self._local.reader = con
+        return con
+
+    def release_reader(self):
+        """ Close the reader of the calling thread, if it has one """
+        con = getattr(self._local, "reader", None)
+        if con is None:
+            return
+        self._local.reader = None
+        with self._connections_lock:
+            if con in self._connections:
+                self._connections.remove(con)
+        con.close()
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            with self._writer:
+                yield self._writer
+
+    def close(self):
+        with self._write_lock, self._connections_lock:
+            for con in self._connections:
+                con.close()
+            self._connections = []
+            self._writer = None
+            self._local = threading.local()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_manager(db):
+    """ Get the ConnectionManager for a database file, creating it the first time """
+    with _managers_lock:
+        manager = _managers.get(db)
+        if manager is None:
+            manager = ConnectionManager(db)
+            _managers[db] = manager
+        return manager
@@ -4,15 +4,29 @@
     format for data flow in this application.
 """
 # db_interface.py
+from bisect import bisect_left
+from datetime import datetime, timedelta
 import logging
 import sqlite3
 from PyQt5.QtCore import QDateTime, QDate, Qt
 
 logger = logging.getLogger(__name__)
 
+# SQLite versions before 3.32 allow at most 999 ? placeholders in one statement
+MAX_VARIABLES = 900
+EPOCH = datetime(1970, 1, 1)
+
 class TimeOverlapError(Exception):
     pass
 
+def chunked(values, size=MAX_VARIABLES):
+    """ Split a list into lists small enough to use as query parameters """
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def placeholders(count):
+    return ", ".join("?" * count)
+
 # --- Items Table
 def insert_item(con, item_type, item_name):
     sql = "INSERT INTO items (item_type, item_name) VALUES (?, ?)"
@@ -44,6 +58,36 @@ def get_item_id(con, item_type, item_name):
     return item_id
 
 
+def get_item_ids(con, items):
+    """
+        Batch version of get_item_id.
+        items is an iterable of (item_type, item_name) tuples.
+        Returns a dict mapping each of them to its item_id,
+        inserting the items that do not exist yet.
+    """
+    wanted = set(items)
+    item_ids = {}
+    cur = con.cursor()
+
+    def select(names):
+        for chunk in chunked(names):
+            sql = f"""SELECT item_type, item_name, item_id FROM items
+                      WHERE item_name IN ({placeholders(len(chunk))})
+                      ORDER BY item_id"""
+            cur.execute(sql, chunk)
+            for item_type, item_name, item_id in cur.fetchall():
+                if (item_type, item_name) in wanted:
+                    # Same as get_item_id, the oldest row wins if there are duplicates
+                    item_ids.setdefault((item_type, item_name), item_id)
+
+    select(sorted({item_name for _, item_name in wanted}))
+    missing = sorted(wanted.difference(item_ids))
+    if missing:
+        cur.executemany("INSERT INTO items (item_type, item_name) VALUES (?, ?)", missing)
+        select(sorted({item_name for _, item_name in missing}))
+    return item_ids
+
+
 # --- Tags Table
 
 def insert_tag(con, tag_name):
@@ -65,16 +109,49 @@ def get_tag_id(con, tag_name):
     return tag_id
 
 
+def get_tag_ids(con, tag_names):
+    """
+        Batch version of get_tag_id.
+        Returns a dict mapping each tag name to its tag_id,
+        inserting the tags that do not exist yet.
+    """
+    wanted = set(tag_names)
+    tag_ids = {}
+    cur = con.cursor()
+
+    def select(names):
+        for chunk in chunked(names):
+            sql = f"""SELECT tag_name, tag_id FROM tags
+                      WHERE tag_name IN ({placeholders(len(chunk))})
+                      ORDER BY tag_id"""
+            cur.execute(sql, chunk)
+            for tag_name, tag_id in cur.fetchall():
+                tag_ids.setdefault(tag_name, tag_id)
+
+    select(sorted(wanted))
+    missing = sorted(wanted.difference(tag_ids))
+    if missing:
+        cur.executemany("INSERT INTO tags (tag_name) VALUES (?)", [(tag,) for tag in missing])
+        select(missing)
+    return tag_ids
+
+
 # --- Tag_Map Table
 
 def insert_tag_map(con, item_id, tag_id):
-    # This function should check to make sure there is not a row that already
-    # contains these values
-    sql = "INSERT INTO tag_map (item_id, tag_id) VALUES (?, ?)"
+    # The primary key on tag_map makes OR IGNORE skip pairs that already exist
+    sql = "INSERT OR IGNORE INTO tag_map (item_id, tag_id) VALUES (?, ?)"
     cur = con.cursor()
     cur.execute(sql, (item_id, tag_id))
 
 
+def insert_tag_maps(con, pairs):
+    """ Insert many (item_id, tag_id) pairs, skipping the ones already in the table """
+    sql = "INSERT OR IGNORE INTO tag_map (item_id, tag_id) VALUES (?, ?)"
+    cur = con.cursor()
+    cur.executemany(sql, pairs)
+
+
 def get_item_tags(con, item_id):
     sql = """SELECT tag_name FROM tag_map
             INNER JOIN tags ON tags.tag_id = tag_map.tag_id
@@ -85,8 +162,8 @@ def get_item_tags(con, item_id):
     rows = cur.fetchall()
     # tags is a list of tuples that contain one tag_name
     # I would rather have a list of tag_names.
-    # This is tough because the way you handle this is totally dependant on the row_factory...
-    tags = [row['tag_name'] for row in rows]
+    # Indexing by position works with or without a row_factory
+    tags = [row[0] for row in rows]
 
     return tags
 
@@ -136,6 +213,8 @@ def update_rating_row(con, date, rating):
     cur.execute(sql, (rating, isodate))
 
 def get_ratings(con, oldest_date, newest_date):
+    # Dates are stored as ISO strings so they can be compared directly.
+    # Wrapping the column in date() would stop SQLite from using the primary key.
     sql = "SELECT * FROM ratings"
     
     args = []
@@ -143,11 +222,11 @@ def get_ratings(con, oldest_date, newest_date):
         sql += " WHERE"
     if oldest_date:
         args.append(oldest_date.toString(Qt.ISODate))
-        sql += " date(date) >= ?"
+        sql += " date >= ?"
     if newest_date:
         if oldest_date:
             sql += " AND "
-        sql += " date(date) <= ?"
+        sql += " date <= ?"
         args.append(newest_date.toString(Qt.ISODate))
         
     cur = con.cursor()
@@ -167,8 +246,84 @@ def get_rating_by_date(con, date):
     return rating
 
 
+# --- Daily Summary Table
+# Kept up to date by triggers on the schedule and ratings tables
+
+def get_daily_summaries(con, oldest_date=None, newest_date=None):
+    """
+        Get the daily_summary rows for every day from oldest_date to
+        newest_date (QDates), inclusive, in order.
+        Days that have no plans and no rating do not have a row.
+    """
+    where, args = day_between("day", oldest_date, newest_date)
+    sql = f"""SELECT day, total_tasks, completed_tasks, timeframe_minutes, rating
+              FROM daily_summary
+              {where}
+              ORDER BY day"""
+    cur = con.cursor()
+    cur.execute(sql, args)
+    rows = cur.fetchall()
+    return rows
+
+
+# --- Change Counter Table
+# Kept up to date by triggers on the items, schedule and ratings tables
+
+def get_change_counter(con):
+    """ Number of changes made to the items, schedule and ratings tables.
+        Anything computed from those tables is current as long as this has not changed. """
+    sql = "SELECT changes FROM change_counter WHERE id = 0"
+    cur = con.cursor()
+    cur.execute(sql)
+    changes = cur.fetchone()
+    if changes:
+        changes = changes[0]
+    return changes
+
+
 # Higher Level Functions
 
+def day_bounds(date):
+    """
+        ISO strings for the start of date and the start of the day after it.
+        Rows from that day have start >= the first and < the second.
+        Comparing start to these instead of calling date(start) lets
+        SQLite use the schedule_start index.
+    """
+    return date.toString(Qt.ISODate), date.addDays(1).toString(Qt.ISODate)
+
+def start_between(oldest_date, newest_date):
+    """
+        WHERE clause and arguments that keep schedule rows whose start is on
+        a day from oldest_date to newest_date, inclusive.
+        Either date can be None to leave that end of the range open.
+    """
+    conditions = []
+    args = []
+    if oldest_date:
+        conditions.append("schedule.start >= ?")
+        args.append(day_bounds(oldest_date)[0])
+    if newest_date:
+        conditions.append("schedule.start < ?")
+        args.append(day_bounds(newest_date)[1])
+    if not conditions:
+        return "", ()
+    return " WHERE " + " AND ".join(conditions), tuple(args)
+
+def day_between(column, oldest_date, newest_date):
+    """ Same as start_between for a column that holds ISO dates, like ratings.date """
+    conditions = []
+    args = []
+    if oldest_date:
+        conditions.append(f"{column} >= ?")
+        args.append(oldest_date.toString(Qt.ISODate))
+    if newest_date:
+        conditions.append(f"{column} <= ?")
+        args.append(newest_date.toString(Qt.ISODate))
+    if not conditions:
+        return "", ()
+    return " WHERE " + " AND ".join(conditions), tuple(args)
+
 def get_table_columns(con, tablename):
     """
     Get the column names from a table. I am making this so the stats script is able to create a dataframe even if there are no items in a table.
@@ -187,43 +342,122 @@ def get_table_columns(con, tablename):
     cur.execute(f"SELECT * FROM {tablename}")
     return [item[0] for item in cur.description]
 
-# NOTE I don't know if I need this?
-# NOTE If it turns out I do need this I'll have to convert it to
-#      work with QDate
+def get_max_duration(con):
+    """ Length of the longest item in the schedule table in minutes.
+        The schedule_duration index makes this a single lookup. """
+    sql = "SELECT max(duration) FROM schedule"
+    cur = con.cursor()
+    cur.execute(sql)
+    max_duration = cur.fetchone()[0]
+    if max_duration is None:
+        max_duration = 0
+    return max_duration
+
 def time_overlap(con, item_type, start, duration):
     """
-        User Defined Function that prevents you from scheduling
-        two items of the same type with overlapping times.
+        Prevents you from scheduling two items of the same type
+        with overlapping times.
         I am doing this because I'm not sure how I would display
         two Tasks or timeframes that have overlapping times
 
-        Created in the database with sqlite3.create_function
-        in the create_schedule_table function
+        An item can only overlap the new one if it starts before the new
+        one ends and no earlier than the longest duration in the table before
+        the new one starts. That window is a range scan over the schedule_start
+        index so the cost does not grow with the size of the schedule.
     """
-    con.row_factory = sqlite3.Row # NOTE : there has to be a better way to handle passing database connections around
-    sql = """SELECT item_type, start, duration FROM schedule
-             JOIN items on items.item_id = schedule.item_id"""
+    if duration is None:
+        duration = 0
+    sql = """SELECT 1 FROM schedule
+             JOIN items ON items.item_id = schedule.item_id
+             WHERE schedule.start >= ? AND schedule.start < ?
+             AND items.item_type = ?
+             AND datetime(schedule.start, '+' || schedule.duration || ' minutes') > datetime(?)
+             LIMIT 1"""
+    earliest_start = start.addSecs(get_max_duration(con) * -60)
+    end = start.addSecs(duration * 60)
+    iso_start = start.toString(Qt.ISODate)
     cur = con.cursor()
-    cur.execute(sql)
-    rows = cur.fetchall()
+    cur.execute(sql, (earliest_start.toString(Qt.ISODate), end.toString(Qt.ISODate), item_type, iso_start))
+    return cur.fetchone() is not None
 
-    for row in rows:
-        row_qdatetime = QDateTime.fromString(row['start'], Qt.ISODate)
-        starts_before_ends = start < row_qdatetime.addSecs(row['duration'] * 60)
-        ends_after_starts = start.addSecs(duration * 60) > row_qdatetime
-        if (item_type == row['item_type']) and starts_before_ends and ends_after_starts:
-           return True
-    return False
+def to_seconds(iso_datetime):
+    """ Seconds since the epoch of an ISO datetime string, ignoring time zones
+        the same way SQLite's strftime('%s', ...) does """
+    return int((datetime.fromisoformat(iso_datetime) - EPOCH).total_seconds())
+
+def find_overlaps(con, intervals):
+    """
+        Batch version of time_overlap.
+        intervals is a list of (item_type, start, end) tuples where start and end
+        are seconds since the epoch (see to_seconds).
+
+        Returns the set of indexes of the intervals that overlap an item already
+        in the schedule, or another interval in the list of the same type that
+        starts before it (ties go to the one earlier in the list).
+
+        The schedule is read with a single range query covering every interval.
+        Then each type is swept once in order of start time, keeping only the
+        accepted intervals that have not ended yet.
+    """
+    rejected = set()
+    if not intervals:
+        return rejected
+
+    # Items already in the schedule, grouped by type and sorted by start
+    max_length = get_max_duration(con) * 60
+    earliest = EPOCH + timedelta(seconds=min(i[1] for i in intervals) - max_length)
+    latest = EPOCH + timedelta(seconds=max(i[2] for i in intervals))
+    sql = """SELECT items.item_type, CAST(strftime('%s', schedule.start) AS INTEGER), schedule.duration * 60
+             FROM schedule
+             JOIN items ON items.item_id = schedule.item_id
+             WHERE schedule.start >= ? AND schedule.start < ?
+             ORDER BY schedule.start"""
+    cur = con.cursor()
+    cur.execute(sql, (earliest.isoformat(), latest.isoformat()))
+    existing = {}
+    for item_type, start, length in cur.fetchall():
+        starts, ends = existing.setdefault(item_type, ([], []))
+        starts.append(start)
+        ends.append(start + length)
+
+    order = sorted(range(len(intervals)), key=lambda i: (intervals[i][0], intervals[i][1], i))
+    active = []
+    active_type = None
+    for index in order:
+        item_type, start, end = intervals[index]
+        # Compare against the schedule
+        starts, ends = existing.get(item_type, ((), ()))
+        row = bisect_left(starts, start - max_length)
+        while row < len(starts) and starts[row] < end:
+            if ends[row] > start:
+                rejected.add(index)
+                break
+            row += 1
+        if index in rejected:
+            continue
+        # Compare against the accepted intervals of this type that are still going
+        if item_type != active_type:
+            active, active_type = [], item_type
+        active = [(a_start, a_end) for a_start, a_end in active if a_end > start]
+        if any(a_start < end for a_start, _ in active):
+            rejected.add(index)
+        else:
+            active.append((start, end))
+    return rejected
 
 # Saving data
 
 def set_tags(con, item_id, tags):
+    """
+        Give an item every tag in tags.
+        All of the tag names are resolved with get_tag_ids and the pairs
+        the item does not have yet are added with one executemany,
+        so the number of queries does not depend on the number of tags.
+    """
     #TODO I think some higher level code should make sure all strings passed into this are lowercase
     assert isinstance(tags, list)
-    for tag in tags:
-        if not tag in get_item_tags(con, item_id):
-            tag_id = get_tag_id(con, tag)
-            insert_tag_map(con, item_id, tag_id)
+    tag_ids = get_tag_ids(con, tags)
+    insert_tag_maps(con, [(item_id, tag_id) for tag_id in sorted(tag_ids.values())])
 
 
 def create_schedule_item(con, item_type, item_name, tags, description, start, duration):
@@ -247,6 +481,56 @@ def create_schedule_item(con, item_type, item_name, tags, description, start, du
 
     return active_id
 
+def create_schedule_items(con, plans):
+    """
+        Schedule many items at once.
+
+        plans is an iterable of tuples with the arguments of create_schedule_item:
+            (item_type, item_name, tags, description, start, duration)
+        A seventh completed value can be added to a plan, otherwise tasks are
+        not completed.
+
+        Plans that overlap an item already scheduled or another plan of the same
+        type that starts before them are rejected instead of raising a TimeOverlapError.
+        Items and tags are looked up and created in batches and every accepted
+        plan is inserted with a single executemany, all in the connection's
+        current transaction.
+
+        Returns a sorted list of the indexes of the rejected plans.
+    """
+    rows = []
+    intervals = []
+    for plan in plans:
+        item_type, item_name, tags, description, start, duration = plan[:6]
+        if duration is None:
+            duration = 0
+        if len(plan) > 6:
+            completed = plan[6]
+        elif item_type == 1:
+            completed = None
+        else:
+            completed = 0
+        iso_start = start.toString(Qt.ISODate)
+        start_secs = to_seconds(iso_start)
+        rows.append((item_type, item_name, tags, description, iso_start, duration, completed))
+        intervals.append((item_type, start_secs, start_secs + duration * 60))
+
+    rejected = find_overlaps(con, intervals)
+    accepted = [row for index, row in enumerate(rows) if index not in rejected]
+
+    item_ids = get_item_ids(con, ((row[0], row[1]) for row in accepted))
+    tag_names = {tag for row in accepted if row[2] for tag in row[2]}
+    if tag_names:
+        tag_ids = get_tag_ids(con, tag_names)
+        tag_pairs = {(item_ids[row[0], row[1]], tag_ids[tag]) for row in accepted if row[2] for tag in row[2]}
+        insert_tag_maps(con, sorted(tag_pairs))
+
+    sql = """INSERT INTO schedule (item_id, description, start, duration, completed) VALUES (?, ?, ?, ?, ?)"""
+    cur = con.cursor()
+    cur.executemany(sql, ((item_ids[item_type, item_name], description, start, duration, completed)
+                          for item_type, item_name, _, description, start, duration, completed in accepted))
+    return sorted(rejected)
+
 def update_schedule_item(con, active_id, item_id, tags, description, start, duration, completed):
     sql = """
              UPDATE schedule SET description = ?, start = ?, duration = ?, completed = ?
@@ -292,23 +576,35 @@ def get_schedule_item_tags(con, active_id):
 
 def get_templates(con):
     """
-        Select the item type and name from each row in the items table
+        Select the item type, name, use count and last used start of each
+        item that is in the schedule.
         This function is intended to be used in the GUI program to build a widget
         containing a button for each unique item.
-        This is incomplete because I wanted the templates to have some extra data
-        that would allow for them to be sorted.
-            ex: I want to select each item_type and item_id joined with the
-            most recent start attribute from the schedule table. I just don't
-            remember how to do that SQL.
+        The templates table is kept up to date by triggers on the schedule table
+        (see init_db.MIGRATIONS) so this reads one row per item instead of
+        grouping every row in the schedule.
     """
-    # TODO: learn SQL again and figure out how to get one row for each unique
-    # item_type and item_name joined with the newest start datetime
-    sql = """SELECT item_type, item_name, COUNT(*) AS 'count' FROM schedule JOIN items ON schedule.item_id = items.item_id GROUP BY items.item_id"""
+    sql = """SELECT item_type, item_name, use_count AS 'count', last_used
+             FROM templates
+             JOIN items ON templates.item_id = items.item_id"""
     cur = con.cursor()
     cur.execute(sql)
     templates = cur.fetchall()
     return templates
 
+def get_item_uses(con):
+    """
+        Select the item type, name, use count and last used start of every
+        item, including the ones that are not in the schedule (their count is 0).
+        Used to fill the index behind the name completer in the ScheduleForm.
+    """
+    sql = """SELECT item_type, item_name, coalesce(use_count, 0) AS 'count', last_used
+             FROM items
+             LEFT JOIN templates ON templates.item_id = items.item_id"""
+    cur = con.cursor()
+    cur.execute(sql)
+    return cur.fetchall()
+
 def get_schedule_item(con, active_id):
     sql = """ SELECT active_id, items.item_type, items.item_id, items.item_name, description, start, duration, completed
             FROM schedule
@@ -319,16 +615,21 @@ def get_schedule_item(con, active_id):
     row = cur.fetchone()
     return row
 
+def same_row(row, other):
+    """ True if two schedule rows have the same columns and values.
+        A sqlite3.Row never equals a dict, even one made from it, so rows
+        that were changed in memory have to be compared this way. """
+    return dict(row) == dict(other)
+
 def get_schedule_by_date(con, date):
     """ Get rows from the schedule joined with the items table from a single day """
     sql = """ SELECT active_id, items.item_type, items.item_id, items.item_name, description, start, duration, completed
               FROM schedule
               JOIN items ON items.item_id = schedule.item_id
-              WHERE date(start) = ?
+              WHERE start >= ? AND start < ?
               ORDER BY start;"""
-    iso_date = date.toString(Qt.ISODate)
     cur = con.cursor()
-    cur.execute(sql, (iso_date,))
+    cur.execute(sql, day_bounds(date))
     rows = cur.fetchall()
     return rows
 
@@ -340,33 +641,21 @@ def get_schedule(con, oldest_date=None, newest_date=None):
         need to plot them.
 
         parameters
-        oldest_date : datetime.date object. Only select rows from the table
+        oldest_date : QDate object. Only select rows from the table
         who have dates that come on or after this date.
-        newest_date : datetime.date object. Only select rows from the table
+        newest_date : QDate object. Only select rows from the table
         who have dates that come on or before this date.
 
         Leave both empty (or None) to select all rows from the table.
 
     """
-    sql = """ SELECT active_id, items.item_type, items.item_id, items.item_name, description, start, duration, completed  FROM schedule
+    where, args = start_between(oldest_date, newest_date)
+    sql = f""" SELECT active_id, items.item_type, items.item_id, items.item_name, description, start, duration, completed  FROM schedule
               INNER JOIN items ON schedule.item_id = items.item_id
-          """
-    oldest_date_sql = " date(start) >= ?"
-    newest_date_sql = " date(start) <= ?"
-    args = []
-    if oldest_date or newest_date:
-        sql += " WHERE"
-    if oldest_date:
-        sql += oldest_date_sql
-        args.append(oldest_date.toString(Qt.ISODate))
-    if newest_date:
-        if oldest_date:
-            sql += " AND "
-        sql += newest_date_sql
-        args.append(newest_date.toString(Qt.ISODate))
-    sql += " ORDER BY start;"
+              {where}
+              ORDER BY start;"""
     cur = con.cursor()
-    cur.execute(sql, tuple(args))
+    cur.execute(sql, args)
     schedule = cur.fetchall()
     return schedule
 
@@ -374,50 +663,137 @@ def get_schedule(con, oldest_date=None, newest_date=None):
 # Functions for the statistics feature
 def get_schedule_for_stats(con, oldest_date=None, newest_date=None):
     """
-        Query the entire DB for data that will be used for statistics.
+        Query the DB for data that will be used for statistics.
         Does not include any ids because the stats page does not need
         to access specific items
 
         Pretty much a copy of the get_schedule function above but
         gets less data to save time and memory
     """
-    sql = """
+    where, args = start_between(oldest_date, newest_date)
+    sql = f"""
              SELECT item_name, item_type,
              length(description) as description,
              start, duration, completed
              FROM schedule
                 JOIN items ON items.item_id = schedule.item_id
+             {where}
+             ORDER BY schedule.start;
           """
-    oldest_date_sql = " 'date' >= ?"
-    newest_date_sql = " 'date' <= ?"
-    args = []
-    if oldest_date or newest_date:
-        sql += " WHERE"
-    if oldest_date:
-        if not isinstance(oldest_date, (datetime.datetime, datetime.date)):
-            raise ValueError(f'oldest date must be datetime.date, not {type(oldest_date)}')
-        sql += oldest_date_sql
-        args.append(oldest_date.toString(Qt.ISODate))
-    if newest_date:
-        if not isinstance(newest_date, (datetime.datetime, datetime.date)):
-            raise ValueError(f'newest date must be datetime.date, not {type(newest_date)}')
-        if oldest_date:
-            sql += " AND "
-        sql += newest_date_sql
-        args.append(newest_date.toString(Qt.ISODate))
-    sql += " ORDER BY schedule.start;"
     cur = con.cursor()
-    cur.execute(sql, tuple(args))
+    cur.execute(sql, args)
     rows = cur.fetchall()
     return rows
 
-def get_ratings_for_stats(con):
-    sql = "SELECT date, rating FROM ratings;"
+def get_ratings_for_stats(con, oldest_date=None, newest_date=None):
+    where, args = day_between("date", oldest_date, newest_date)
+    sql = f"SELECT date, rating FROM ratings {where};"
     cur = con.cursor()
-    cur.execute(sql)
+    cur.execute(sql, args)
+    rows = cur.fetchall()
+    return rows
+
+def get_item_stats(con, oldest_date=None, newest_date=None):
+    """
+        One row per item scheduled between the two dates with the number of
+        times it was scheduled, how many of those were completed and the
+        total minutes, all counted by SQLite.
+    """
+    where, args = start_between(oldest_date, newest_date)
+    sql = f"""SELECT items.item_type, items.item_name,
+                     count(*) AS count,
+                     sum(ifnull(completed, 0) = 1) AS completed,
+                     sum(duration) AS minutes
+              FROM schedule
+              JOIN items ON items.item_id = schedule.item_id
+              {where}
+              GROUP BY schedule.item_id"""
+    cur = con.cursor()
+    cur.execute(sql, args)
     rows = cur.fetchall()
     return rows
 
+def get_summary_totals(con, oldest_date=None, newest_date=None):
+    """
+        Totals of the daily_summary table between the two dates:
+        rated_days, rating_sum, total_tasks and completed_tasks
+    """
+    where, args = day_between("day", oldest_date, newest_date)
+    sql = f"""SELECT count(rating) AS rated_days,
+                     ifnull(sum(rating), 0) AS rating_sum,
+                     ifnull(sum(total_tasks), 0) AS total_tasks,
+                     ifnull(sum(completed_tasks), 0) AS completed_tasks
+              FROM daily_summary
+              {where}"""
+    cur = con.cursor()
+    cur.execute(sql, args)
+    row = cur.fetchone()
+    return row
+
+# The functions below read rows as plain tuples in batches so the stats
+# module can copy them straight into numpy arrays without building a
+# sqlite3.Row for every plan.
+
+def count_schedule(con, oldest_date=None, newest_date=None):
+    where, args = start_between(oldest_date, newest_date)
+    sql = f"SELECT count(*) FROM schedule {where}"
+    cur = con.cursor()
+    cur.execute(sql, args)
+    return cur.fetchone()[0]
+
+def get_schedule_batches(con, oldest_date=None, newest_date=None, batch_size=4096):
+    """
+        Yield lists of up to batch_size tuples of integers:
+        (start in minutes since the epoch, duration, item_type, item_id, completed)
+        completed is -1 for items that can not be completed.
+    """
+    where, args = start_between(oldest_date, newest_date)
+    # julianday is quicker than strftime('%s') because it does not format a string
+    sql = f"""SELECT CAST(round((julianday(schedule.start) - 2440587.5) * 1440) AS INTEGER),
+                     schedule.duration, items.item_type, schedule.item_id,
+                     ifnull(schedule.completed, -1)
+              FROM schedule
+              JOIN items ON items.item_id = schedule.item_id
+              {where}
+              ORDER BY schedule.start"""
+    cur = con.cursor()
+    cur.row_factory = None
+    cur.execute(sql, args)
+    batch = cur.fetchmany(batch_size)
+    while batch:
+        yield batch
+        batch = cur.fetchmany(batch_size)
+
+def count_ratings(con, oldest_date=None, newest_date=None):
+    where, args = day_between("date", oldest_date, newest_date)
+    sql = f"SELECT count(*) FROM ratings {where}"
+    cur = con.cursor()
+    cur.execute(sql, args)
+    return cur.fetchone()[0]
+
+def get_rating_batches(con, oldest_date=None, newest_date=None, batch_size=4096):
+    """ Yield lists of (days since the epoch, rating) tuples """
+    where, args = day_between("date", oldest_date, newest_date)
+    sql = f"""SELECT CAST(julianday(date) - 2440587.5 AS INTEGER), rating
+              FROM ratings
+              {where}
+              ORDER BY date"""
+    cur = con.cursor()
+    cur.row_factory = None
+    cur.execute(sql, args)
+    batch = cur.fetchmany(batch_size)
+    while batch:
+        yield batch
+        batch = cur.fetchmany(batch_size)
+
+def get_item_names(con):
+    """ (item_id, item_name) for every item, in order of item_id """
+    sql = "SELECT item_id, item_name FROM items ORDER BY item_id"
+    cur = con.cursor()
+    cur.row_factory = None
+    cur.execute(sql)
+    return cur.fetchall()
+
 def get_avg_rating(con):
     sql = "SELECT avg(rating) FROM ratings;"
 
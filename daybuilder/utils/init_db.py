@@ -78,6 +78,170 @@ def create_rating_table(db):
     con.execute(sql)
     con.close()
 
+# Schema changes made after the first release.
+# The version of a database is stored in SQLite's user_version pragma.
+# Each script upgrades a database from the version equal to its index
+# to the next version. Only ever append to this list.
+MIGRATIONS = [
+    # 1: indexes for queries on a range of times.
+    #    schedule_duration makes max(duration) a single lookup, time_overlap
+    #    in the db_interface uses that to bound its search.
+    """CREATE INDEX IF NOT EXISTS schedule_start ON schedule (start);
+       CREATE INDEX IF NOT EXISTS schedule_duration ON schedule (duration);""",
+    # 2: tag names are unique so they can be looked up with an index.
+    #    Duplicate tags are merged into the oldest one first.
+    """UPDATE OR IGNORE tag_map SET tag_id = (
+           SELECT min(same_name.tag_id) FROM tags
+           JOIN tags AS same_name ON same_name.tag_name = tags.tag_name
+           WHERE tags.tag_id = tag_map.tag_id);
+       DELETE FROM tag_map WHERE tag_id NOT IN (SELECT min(tag_id) FROM tags GROUP BY tag_name);
+       DELETE FROM tags WHERE tag_id NOT IN (SELECT min(tag_id) FROM tags GROUP BY tag_name);
+       CREATE UNIQUE INDEX IF NOT EXISTS tags_name ON tags (tag_name);""",
+    # 3: templates holds how many times each item has been scheduled and
+    #    when it was last scheduled. The triggers keep it current so the
+    #    Quick Reuse panel does not have to group the whole schedule table.
+    """CREATE TABLE IF NOT EXISTS templates (
+           item_id integer PRIMARY KEY,
+           use_count integer NOT NULL,
+           last_used datetime,
+           FOREIGN KEY (item_id) REFERENCES items (item_id)
+       );
+       CREATE INDEX IF NOT EXISTS schedule_item_start ON schedule (item_id, start);
+       INSERT OR REPLACE INTO templates (item_id, use_count, last_used)
+           SELECT item_id, count(*), max(start) FROM schedule GROUP BY item_id;
+
+       CREATE TRIGGER IF NOT EXISTS templates_insert AFTER INSERT ON schedule
+       BEGIN
+           INSERT INTO templates (item_id, use_count, last_used) VALUES (new.item_id, 1, new.start)
+           ON CONFLICT (item_id) DO UPDATE SET use_count = use_count + 1, last_used = max(last_used, new.start);
+       END;
+
+       CREATE TRIGGER IF NOT EXISTS templates_delete AFTER DELETE ON schedule
+       BEGIN
+           UPDATE templates SET use_count = use_count - 1,
+               last_used = (SELECT max(start) FROM schedule WHERE item_id = old.item_id)
+               WHERE item_id = old.item_id;
+           DELETE FROM templates WHERE item_id = old.item_id AND use_count <= 0;
+       END;
+
+       CREATE TRIGGER IF NOT EXISTS templates_update AFTER UPDATE OF item_id, start ON schedule
+       BEGIN
+           UPDATE templates SET use_count = use_count - 1,
+               last_used = (SELECT max(start) FROM schedule WHERE item_id = old.item_id)
+               WHERE item_id = old.item_id;
+           DELETE FROM templates WHERE item_id = old.item_id AND use_count <= 0;
+           INSERT INTO templates (item_id, use_count, last_used) VALUES (new.item_id, 1, new.start)
+           ON CONFLICT (item_id) DO UPDATE SET use_count = use_count + 1,
+               last_used = (SELECT max(start) FROM schedule WHERE item_id = new.item_id);
+       END;""",
+    # 4: daily_summary has the numbers shown in the history view for each day.
+    #    The triggers on the schedule and ratings tables add and subtract each
+    #    row's share so reading a month is one range scan over the primary key.
+    """CREATE TABLE IF NOT EXISTS daily_summary (
+           day date PRIMARY KEY,
+           total_tasks integer NOT NULL DEFAULT 0,
+           completed_tasks integer NOT NULL DEFAULT 0,
+           timeframe_minutes integer NOT NULL DEFAULT 0,
+           rating integer
+       );
+       INSERT OR REPLACE INTO daily_summary (day, total_tasks, completed_tasks, timeframe_minutes)
+           SELECT date(start),
+                  sum(items.item_type = 0),
+                  sum(items.item_type = 0 AND ifnull(completed, 0) = 1),
+                  sum(CASE WHEN items.item_type = 1 THEN duration ELSE 0 END)
+           FROM schedule
+           JOIN items ON items.item_id = schedule.item_id
+           GROUP BY date(start);
+       INSERT INTO daily_summary (day, rating) SELECT date(date), rating FROM ratings WHERE true
+           ON CONFLICT (day) DO UPDATE SET rating = excluded.rating;
+
+       CREATE TRIGGER IF NOT EXISTS daily_summary_insert AFTER INSERT ON schedule
+       BEGIN
+           INSERT INTO daily_summary (day) VALUES (date(new.start)) ON CONFLICT (day) DO NOTHING;
+           UPDATE daily_summary SET
+               total_tasks = total_tasks + ifnull((SELECT item_type = 0 FROM items WHERE item_id = new.item_id), 0),
+               completed_tasks = completed_tasks + ifnull((SELECT item_type = 0 FROM items WHERE item_id = new.item_id), 0) * (ifnull(new.completed, 0) = 1),
+               timeframe_minutes = timeframe_minutes + ifnull((SELECT item_type = 1 FROM items WHERE item_id = new.item_id), 0) * new.duration
+           WHERE day = date(new.start);
+       END;
+
+       CREATE TRIGGER IF NOT EXISTS daily_summary_delete AFTER DELETE ON schedule
+       BEGIN
+           UPDATE daily_summary SET
+               total_tasks = total_tasks - ifnull((SELECT item_type = 0 FROM items WHERE item_id = old.item_id), 0),
+               completed_tasks = completed_tasks - ifnull((SELECT item_type = 0 FROM items WHERE item_id = old.item_id), 0) * (ifnull(old.completed, 0) = 1),
+               timeframe_minutes = timeframe_minutes - ifnull((SELECT item_type = 1 FROM items WHERE item_id = old.item_id), 0) * old.duration
+           WHERE day = date(old.start);
+       END;
+
+       CREATE TRIGGER IF NOT EXISTS daily_summary_update AFTER UPDATE OF item_id, start, duration, completed ON schedule
+       BEGIN
+           UPDATE daily_summary SET
+               total_tasks = total_tasks - ifnull((SELECT item_type = 0 FROM items WHERE item_id = old.item_id), 0),
+               completed_tasks = completed_tasks - ifnull((SELECT item_type = 0 FROM items WHERE item_id = old.item_id), 0) * (ifnull(old.completed, 0) = 1),
+               timeframe_minutes = timeframe_minutes - ifnull((SELECT item_type = 1 FROM items WHERE item_id = old.item_id), 0) * old.duration
+           WHERE day = date(old.start);
+           INSERT INTO daily_summary (day) VALUES (date(new.start)) ON CONFLICT (day) DO NOTHING;
+           UPDATE daily_summary SET
+               total_tasks = total_tasks + ifnull((SELECT item_type = 0 FROM items WHERE item_id = new.item_id), 0),
+               completed_tasks = completed_tasks + ifnull((SELECT item_type = 0 FROM items WHERE item_id = new.item_id), 0) * (ifnull(new.completed, 0) = 1),
+               timeframe_minutes = timeframe_minutes + ifnull((SELECT item_type = 1 FROM items WHERE item_id = new.item_id), 0) * new.duration
+           WHERE day = date(new.start);
+       END;
+
+       CREATE TRIGGER IF NOT EXISTS daily_summary_rating_insert AFTER INSERT ON ratings
+       BEGIN
+           INSERT INTO daily_summary (day, rating) VALUES (date(new.date), new.rating)
+           ON CONFLICT (day) DO UPDATE SET rating = excluded.rating;
+       END;
+
+       CREATE TRIGGER IF NOT EXISTS daily_summary_rating_update AFTER UPDATE ON ratings
+       BEGIN
+           UPDATE daily_summary SET rating = NULL WHERE day = date(old.date);
+           INSERT INTO daily_summary (day, rating) VALUES (date(new.date), new.rating)
+           ON CONFLICT (day) DO UPDATE SET rating = excluded.rating;
+       END;
+
+       CREATE TRIGGER IF NOT EXISTS daily_summary_rating_delete AFTER DELETE ON ratings
+       BEGIN
+           UPDATE daily_summary SET rating = NULL WHERE day = date(old.date);
+       END;""",
+    # 5: change_counter goes up every time a row in items, schedule or ratings
+    #    changes. The stats module uses it to tell whether its cache is current
+    #    without reading the tables themselves.
+    """CREATE TABLE IF NOT EXISTS change_counter (
+           id integer PRIMARY KEY CHECK (id = 0),
+           changes integer NOT NULL
+       );
+       INSERT OR IGNORE INTO change_counter (id, changes) VALUES (0, 0);"""
+    + "".join(
+        f"""
+       CREATE TRIGGER IF NOT EXISTS change_counter_{table}_{event.lower()} AFTER {event} ON {table}
+       BEGIN
+           UPDATE change_counter SET changes = changes + 1;
+       END;"""
+        for table in ("items", "schedule", "ratings")
+        for event in ("INSERT", "UPDATE", "DELETE")
+    ),
+]
+
+def upgrade_db(db):
+    """
+    Run every migration the database has not had yet.
+    This is safe to call every time the program starts.
+    """
+    con = sqlite3.connect(db)
+    try:
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            con.executescript(f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;")
+    except sqlite3.Error:
+        if con.in_transaction:
+            con.rollback()
+        raise
+    finally:
+        con.close()
+
 # User defined function
 def time_overlap(item_type_a, start_a, duration_a, item_type_b, start_b, duration_b):
     """
@@ -108,6 +272,7 @@ def main(db):
     create_tag_map_table(db)
     create_schedule_table(db)
     create_rating_table(db)
+    upgrade_db(db)
     #create_time_overlap_udf(db)
 
 if __name__ == "__main__":
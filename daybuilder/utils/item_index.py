@@ -0,0 +1,212 @@
+"""
+    Module that keeps every item name in memory, sorted and searchable,
+    so the Quick Reuse panel does not have to sort or scan all of them
+    each time something changes.
+
+    Each item type has a list of its items for every sort order in SORTS.
+    The lists are kept sorted with bisect, so adding an item or counting
+    another use of one only has to find its place instead of sorting again.
+    Only items that have been used (count above 0) are in the lists, those
+    are the ones the Quick Reuse panel has a button for. Items that are not
+    in the schedule are kept in one more list per type, in "use" order, so
+    they can still be searched and suggested.
+
+    Searching goes through a trigram index: the set of items whose
+    (casefolded) name contains each three letter piece of text. The items
+    that contain a longer search are in the intersection of the sets for
+    its trigrams, the ones that contain a shorter search are in the union
+    of the sets for the trigrams it is part of. Only those items are
+    checked with 'in'. The trigrams are worked out the first time something
+    is searched, so loading the index stays quick.
+
+    suggest is what the ScheduleForm's name completer shows. It first walks
+    the "use" list from the most used item down, which finds the suggestions
+    for a common search right away. If the first few hundred items do not
+    have enough of them it ranks the matches from the n-gram index instead,
+    so a search that matches little never goes through every item.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+import heapq
+from itertools import chain, islice
+
+Item = namedtuple("Item", ["item_type", "name", "count", "last_used"])
+
+# Sort order: function that makes the key an item is sorted by.
+# The name comes last in each key so items that tie are still in a fixed order
+# and an item's place in the list can be found from its key.
+SORTS = {
+    "name": lambda item: (item.name,),
+    "count": lambda item: (item.count, item.name),
+    "last_used": lambda item: (item.last_used or "", item.name),
+    # Most used, then most recently used
+    "use": lambda item: (item.count, item.last_used or "", item.name),
+}
+
+TRIGRAM_LENGTH = 3
+# Number of names suggest returns
+SUGGESTIONS = 10
+# suggest walks this many items per suggestion before it goes to the trigram index
+WALK_RATIO = 50
+
+
+def trigrams(text):
+    return {text[i:i + TRIGRAM_LENGTH] for i in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+
+class ItemIndex:
+    """ Items keyed by (item_type, name) """
+
+    def __init__(self):
+        self.items = {}
+        # (item_type, name): casefolded name
+        self.folded = {}
+        # (item_type, sort): sorted list of keys from SORTS, for used items
+        self.sorted = defaultdict(list)
+        # item_type: sorted list of "use" keys of the items that are not used
+        self.unused = defaultdict(list)
+        # trigram: set of (item_type, name), None until the first search
+        self.trigrams = None
+        # Keys of the items whose names are too short to have a trigram
+        self.short = set()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, item_type, name):
+        return self.items.get((item_type, name))
+
+    def add(self, item_type, name, count=0, last_used=None):
+        """ Add an item, or replace the count and last_used of one that is already here """
+        key = (item_type, name)
+        old_item = self.items.get(key)
+        item = Item(item_type, name, count, last_used)
+        self.items[key] = item
+        if old_item is not None:
+            for ordered, sort_key in self.lists(old_item):
+                del ordered[bisect_left(ordered, sort_key)]
+        for ordered, sort_key in self.lists(item):
+            insort(ordered, sort_key)
+        if old_item is None:
+            self.folded[key] = name.casefold()
+            if self.trigrams is not None:
+                self.index_trigrams(key)
+        return item
+
+    def load(self, rows):
+        """ Add a lot of new items at once, rows are (item_type, name, count, last_used).
+            The lists are sorted once at the end instead of inserting into them one at a time. """
+        for row in rows:
+            item = Item(*row)
+            key = (item.item_type, item.name)
+            self.items[key] = item
+            self.folded[key] = item.name.casefold()
+            if self.trigrams is not None:
+                self.index_trigrams(key)
+        self.sorted.clear()
+        self.unused.clear()
+        for item in self.items.values():
+            for ordered, sort_key in self.lists(item):
+                ordered.append(sort_key)
+        for ordered in chain(self.sorted.values(), self.unused.values()):
+            ordered.sort()
+
+    def lists(self, item):
+        """ The sorted lists an item goes in, with its key in each """
+        if item.count:
+            return [(self.sorted[(item.item_type, sort)], sort_key(item)) for sort, sort_key in SORTS.items()]
+        return [(self.unused[item.item_type], SORTS["use"](item))]
+
+    def used(self, item_type, name, start):
+        """ Count another use of an item scheduled at start (an ISO string),
+            adding it if it is new """
+        item = self.items.get((item_type, name))
+        if item is None:
+            return self.add(item_type, name, 1, start)
+        last_used = max(item.last_used, start) if item.last_used else start
+        return self.add(item_type, name, item.count + 1, last_used)
+
+    def position(self, item_type, name, sort):
+        """ Where a used item is in the list of its type sorted by sort """
+        return bisect_left(self.sorted[(item_type, sort)], SORTS[sort](self.items[(item_type, name)]))
+
+    def size(self, item_type):
+        """ Number of used items of a type """
+        return len(self.sorted[(item_type, "name")])
+
+    def ordered(self, item_type, sort, descending=False):
+        """ Names of the used items of a type in order """
+        ordered = self.sorted[(item_type, sort)]
+        if descending:
+            ordered = reversed(ordered)
+        return [key[-1] for key in ordered]
+
+    def index_trigrams(self, key):
+        folded = self.folded[key]
+        if len(folded) < TRIGRAM_LENGTH:
+            self.short.add(key)
+        for trigram in trigrams(folded):
+            self.trigrams[trigram].add(key)
+
+    def build_trigrams(self):
+        """ Index the trigrams of every name if that has not been done yet.
+            The first search does this, it can be called sooner to get it out of the way. """
+        if self.trigrams is None:
+            self.trigrams = defaultdict(set)
+            for key in self.folded:
+                self.index_trigrams(key)
+
+    def candidates(self, folded):
+        """ Keys of the items whose names could contain folded text """
+        self.build_trigrams()
+        if len(folded) < TRIGRAM_LENGTH:
+            sets = [keys for trigram, keys in self.trigrams.items() if folded in trigram]
+            return self.short.union(*sets)
+        sets = sorted((self.trigrams.get(trigram, set()) for trigram in trigrams(folded)), key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def search(self, text):
+        """ Keys of the items whose names contain text, ignoring case """
+        text = text.casefold()
+        return {key for key in self.candidates(text) if text in self.folded[key]}
+
+    def in_use_order(self, item_type):
+        """ Keys of the items of a type, most used first and unused last """
+        for use_key in chain(reversed(self.sorted[(item_type, "use")]), reversed(self.unused[item_type])):
+            yield use_key, (item_type, use_key[-1])
+
+    def suggest(self, text, item_type=None, limit=SUGGESTIONS):
+        """ Up to limit names that contain text, most used first.
+            Only items of item_type are suggested unless it is None. """
+        folded = text.casefold()
+        if item_type is None:
+            item_types = sorted({item_type for item_type, _ in self.sorted}.union(self.unused))
+        else:
+            item_types = [item_type]
+        # A common search finds its suggestions among the most used items
+        ordered = heapq.merge(*(self.in_use_order(item_type) for item_type in item_types), reverse=True)
+        walked = (key for _, key in islice(ordered, limit * WALK_RATIO))
+        names = unique_names((key[1] for key in walked if folded in self.folded[key]), limit)
+        if len(names) == limit:
+            return names
+        # Otherwise there are few enough matches to rank all of them
+        keys = [
+            key for key in self.candidates(folded)
+            if key[0] in item_types and folded in self.folded[key]
+        ]
+        keys.sort(key=lambda key: SORTS["use"](self.items[key]), reverse=True)
+        return unique_names((key[1] for key in keys), limit)
+
+
+def unique_names(names, limit):
+    """ The first limit names without repeats, items of different types can have the same name """
+    result = []
+    for name in names:
+        if name not in result:
+            result.append(name)
+            if len(result) == limit:
+                break
+    return result
@@ -0,0 +1,89 @@
+"""
+    Module that works out where each item of a day goes in the ScheduleArea.
+    Tasks that take place within a timeframe are shown inside of it,
+    everything else is shown at the top level in order of start time.
+
+    Nothing here knows about Qt. The ScheduleArea turns its rows into
+    Intervals, calls nest, and moves its widgets to match the result.
+"""
+from collections import namedtuple
+
+# Item types, the same numbers as the items table
+TASK = 0
+TIMEFRAME = 1
+
+# start and end can be anything that can be compared and subtracted,
+# the ScheduleArea uses minutes since midnight
+Interval = namedtuple("Interval", ["key", "item_type", "start", "end"])
+
+# A top level item and the keys of the tasks inside of it, in order
+Placement = namedtuple("Placement", ["key", "children"])
+
+
+def minutes(iso_start):
+    """ Minutes since midnight of an ISO date and time like the ones in the schedule table """
+    return int(iso_start[11:13]) * 60 + int(iso_start[14:16])
+
+
+def contains(outer, inner):
+    """ True if inner takes place within outer.
+        Items with the exact same times are not nested. """
+    if outer.start == inner.start and outer.end == inner.end:
+        return False
+    return outer.start <= inner.start and inner.end <= outer.end
+
+
+def sort_key(interval):
+    # When a timeframe and a task start at the same time the timeframe
+    # has to be seen first so the task can go inside of it.
+    # Longer timeframes come first so the shorter ones are innermost.
+    return (interval.start, interval.item_type != TIMEFRAME, interval.start - interval.end, interval.key)
+
+
+def nest(intervals):
+    """
+        Put every task inside of the innermost timeframe that contains it.
+
+        The intervals are sorted once and swept from the earliest start to
+        the latest, keeping a stack of the timeframes that are still open.
+        A timeframe on top of the stack that ends by the time the current
+        item starts can not contain anything else, so it is popped and never
+        looked at again. That makes the sweep O(n) after the O(n log n) sort.
+
+        Returns a list of Placements for the top level items, in order.
+    """
+    placements = []
+    children = {}
+    open_timeframes = []
+    for interval in sorted(intervals, key=sort_key):
+        while open_timeframes and open_timeframes[-1].end <= interval.start:
+            open_timeframes.pop()
+
+        parent = None
+        if interval.item_type == TASK:
+            # Timeframes can be nested in each other but they should not
+            # partly overlap, so the first one that contains the task is the innermost.
+            for timeframe in reversed(open_timeframes):
+                if contains(timeframe, interval):
+                    parent = timeframe
+                    break
+
+        if parent is None:
+            children[interval.key] = []
+            placements.append(Placement(interval.key, children[interval.key]))
+        else:
+            children[parent.key].append(interval.key)
+
+        if interval.item_type == TIMEFRAME:
+            open_timeframes.append(interval)
+    return placements
+
+
+def parents(placements):
+    """ key: key of the item it is inside of, or None for top level items """
+    result = {}
+    for placement in placements:
+        result[placement.key] = None
+        for child in placement.children:
+            result[child] = placement.key
+    return result
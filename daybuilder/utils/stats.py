@@ -1,57 +1,976 @@
 import collections
 import datetime
-from daybuilder.utils import db_interface
+from daybuilder.utils import db_connection, db_interface
+from PyQt5.QtCore import Qt, QDate
+import json
 import math
+import os
 import pprint
 import sqlite3
 import sys
+import threading
 
-# Testing Testing
-import numpy as np
-import pandas as pd
+# numpy and pandas take a while to import so the functions that use them
+# import them when they are called. That way the Statistics tab can be
+# filled from the cache without loading either of them.
 
 import logging
 
 
-def load_ratings_dataframe(rows):
-    column_names = rows[0].keys()
-    ratings = pd.DataFrame(rows, columns=column_names).astype({"date": "datetime64"})
-    return ratings
+# Number of rows read from SQLite at a time when loading arrays
+FETCH_BATCH = 4096
 
 
-def load_items_dataframe(schedule_rows):
-    types = {"start": "datetime64"}
-    column_names = schedule_rows[0].keys()
-    items = pd.DataFrame(schedule_rows, columns=column_names).astype(types)
+def fill_arrays(batches, dtypes, length):
+    """
+        Copy batches of integer tuples into one array per column.
+        length is the expected number of rows. The arrays are allocated once
+        and only grow if more rows than that come in.
+    """
+    import numpy as np
+    arrays = [np.empty(length, dtype) for dtype in dtypes]
+    position = 0
+    for batch in batches:
+        block = np.array(batch, dtype=np.int64)
+        end = position + len(block)
+        if end > len(arrays[0]):
+            arrays = [np.resize(array, max(end, 2 * len(array))) for array in arrays]
+        for column, array in enumerate(arrays):
+            array[position:end] = block[:, column]
+        position = end
+    return [array[:position] for array in arrays]
 
-    # Convert everything to proper data types
-    completion_dict = {"NaN": None, 0: False, 1: True}
-    items["completed"] = items["completed"].map(completion_dict)
 
+def load_item_arrays(con, start_date=None, end_date=None):
+    """
+        Load the schedule into typed numpy arrays, one per column:
+            start: int64 minutes since the epoch
+            duration: int16 minutes
+            item_type: int16
+            item_code: int32 index into names
+            completed: int8, 1 or 0 for tasks, -1 for timeframes
+            names: array of the unique item names
+    """
+    import numpy as np
+    length = db_interface.count_schedule(con, start_date, end_date)
+    batches = db_interface.get_schedule_batches(con, start_date, end_date, FETCH_BATCH)
+    start, duration, item_type, item_id, completed = fill_arrays(
+        batches, (np.int64, np.int16, np.int16, np.int64, np.int8), length
+    )
+    item_rows = db_interface.get_item_names(con)
+    item_ids = np.fromiter((row[0] for row in item_rows), dtype=np.int64, count=len(item_rows))
+    # Items of different types can share a name, they are counted together
+    names, name_codes = np.unique(
+        np.array([row[1] for row in item_rows], dtype=object), return_inverse=True
+    )
+    item_code = name_codes[np.searchsorted(item_ids, item_id)].astype(np.int32)
+    return {
+        "start": start,
+        "duration": duration,
+        "item_type": item_type,
+        "item_code": item_code,
+        "completed": completed,
+        "names": names,
+    }
+
+
+def load_rating_arrays(con, start_date=None, end_date=None):
+    """ Load the ratings into a datetime64[D] array of days and an int16 array of ratings """
+    import numpy as np
+    length = db_interface.count_ratings(con, start_date, end_date)
+    batches = db_interface.get_rating_batches(con, start_date, end_date, FETCH_BATCH)
+    days, ratings = fill_arrays(batches, (np.int64, np.int16), length)
+    return {"date": days.astype("datetime64[D]"), "rating": ratings}
+
+
+def load_ratings_dataframe(arrays):
+    import pandas as pd
+    return pd.DataFrame({"date": arrays["date"], "rating": arrays["rating"]})
+
+
+def load_items_dataframe(arrays):
+    import pandas as pd
+    completed = arrays["completed"]
+    items = pd.DataFrame({
+        "item_name": pd.Categorical.from_codes(arrays["item_code"], categories=arrays["names"]),
+        "item_type": arrays["item_type"],
+        "start": arrays["start"].astype("datetime64[m]"),
+        "duration": arrays["duration"],
+        # Nullable booleans, timeframes are <NA>
+        "completed": pd.arrays.BooleanArray(completed == 1, completed < 0),
+    })
     return items
 
 
-def load_data(database, start_date=None, end_date=None):
-    with sqlite3.connect(database) as con:
-        con.row_factory = sqlite3.Row
-        ratings_rows = db_interface.get_ratings_for_stats(con)
-        schedule_rows = db_interface.get_schedule_for_stats(con, start_date, end_date)
-        if ratings_rows:
-            ratings = load_ratings_dataframe(ratings_rows)
-        else:
-            ratings = pd.DataFrame(
-                columns=db_interface.get_table_columns(con, "ratings")
-            )
-        if schedule_rows:
-            items = load_items_dataframe(schedule_rows)
-        else:
-            items = pd.DataFrame(
-                columns=db_interface.get_table_columns(con, "schedule")
-            )
+def load_range_arrays(database, start_date=None, end_date=None):
+    """ load_item_arrays and load_rating_arrays between two QDates (None for no limit) """
+    if start_date is None and end_date is None:
+        return load_arrays(database)
+    con = db_connection.get_manager(database).reader()
+    return load_item_arrays(con, start_date, end_date), load_rating_arrays(con, start_date, end_date)
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+ITEM_COLUMNS = ("start", "duration", "item_type", "item_code", "completed")
+
+
+def schedule_key(row):
+    """ (start, duration, item_type, item_name, completed) of a schedule row
+        joined with items, as load_item_arrays stores them """
+    start = (datetime.datetime.fromisoformat(row["start"]) - EPOCH) // datetime.timedelta(minutes=1)
+    completed = -1 if row["completed"] is None else row["completed"]
+    return (start, row["duration"], row["item_type"], row["item_name"], completed)
+
+
+def patch_item_arrays(item_arrays, rows):
+    """
+        Copy of load_item_arrays with rows added and removed, without reading
+        the database. rows is {schedule_key: rows added minus rows removed}.
+        The arrays stay sorted by start, like load_item_arrays returns them.
+    """
+    import numpy as np
+    arrays = dict(item_arrays)
+    names = item_arrays["names"]
+    added = sorted(key for key, count in rows.items() for _ in range(count))
+    new_names = {key[3] for key in added}.difference(names.tolist())
+    if new_names:
+        # The names stay sorted, so the codes after a new name move up
+        names = np.unique(np.concatenate((names.astype(object), np.array(list(new_names), dtype=object))))
+        arrays["names"] = names
+        arrays["item_code"] = np.searchsorted(names, item_arrays["names"].astype(object)).astype(np.int32)[
+            item_arrays["item_code"]
+        ]
+
+    dropped = []
+    for (start, duration, item_type, item_name, completed), count in rows.items():
+        code = np.searchsorted(names, item_name)
+        if count >= 0 or code == len(names) or names[code] != item_name:
+            continue
+        first, last = np.searchsorted(arrays["start"], (start, start + 1))
+        matches = first + np.flatnonzero(
+            (arrays["duration"][first:last] == duration)
+            & (arrays["item_type"][first:last] == item_type)
+            & (arrays["item_code"][first:last] == code)
+            & (arrays["completed"][first:last] == completed)
+        )
+        dropped.extend(matches[:-count])
+    if dropped:
+        for column in ITEM_COLUMNS:
+            arrays[column] = np.delete(arrays[column], dropped)
+
+    if added:
+        values = dict(zip(ITEM_COLUMNS, zip(*added)))
+        values["item_code"] = np.searchsorted(names, np.array(values["item_code"], dtype=object))
+        positions = np.searchsorted(arrays["start"], values["start"], side="right")
+        for column in ITEM_COLUMNS:
+            arrays[column] = np.insert(arrays[column], positions, values[column])
+    return arrays
+
 
+def patch_rating_arrays(rating_arrays, ratings):
+    """
+        Copy of load_rating_arrays with the ratings changed, without reading
+        the database. ratings is {epoch day: (change in rating, change in rated days)}.
+    """
+    import numpy as np
+    days = rating_arrays["date"].astype(np.int64)
+    values = rating_arrays["rating"].copy()
+    for day, (rating_sum, rated_days) in sorted(ratings.items()):
+        position = np.searchsorted(days, day)
+        if position < len(days) and days[position] == day:
+            if rated_days < 0:
+                days = np.delete(days, position)
+                values = np.delete(values, position)
+            else:
+                values[position] += rating_sum
+        elif rated_days > 0:
+            days = np.insert(days, position, day)
+            values = np.insert(values, position, rating_sum)
+    return {"date": days.astype("datetime64[D]"), "rating": values}
+
+
+def load_data(database, start_date=None, end_date=None):
+    item_arrays, rating_arrays = load_range_arrays(database, start_date, end_date)
+    ratings = load_ratings_dataframe(rating_arrays)
+    items = load_items_dataframe(item_arrays)
     return ratings, items
 
 
+# --- Cache
+# Results are saved next to the database along with the value of the
+# change_counter table when they were computed. They are used as long as
+# the counter has not changed.
+
+def aggregates_cache_path(database):
+    return f"{database}-stats.json"
+
+
+def arrays_cache_path(database):
+    return f"{database}-stats.npz"
+
+
+def get_fingerprint(database):
+    return db_interface.get_change_counter(db_connection.get_manager(database).reader())
+
+
+def range_key(start_date, end_date):
+    start = start_date.toString(Qt.ISODate) if start_date else ""
+    end = end_date.toString(Qt.ISODate) if end_date else ""
+    return f"{start}/{end}"
+
+
+# The cube, trends and correlations are only built again once the database changes.
+# They are kept in memory, (name, database, range_key): (fingerprint, result)
+_cached = {}
+_cached_lock = threading.Lock()
+
+def cached_range(name, start_date, end_date):
+    """ The range_key a result is cached under. Trends without an end_date
+        end today, so they are cached under today's date and built again the next day. """
+    if name == "trends" and end_date is None:
+        end_date = QDate.currentDate()
+    return range_key(start_date, end_date)
+
+
+def get_cached(name, database, start_date, end_date, fingerprint):
+    """ The result called name cached for a range, None if there is none
+        or the database changed since """
+    with _cached_lock:
+        cached = _cached.get((name, database, cached_range(name, start_date, end_date)))
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    return None
+
+
+def put_cached(name, database, start_date, end_date, fingerprint, result):
+    with _cached_lock:
+        _cached[(name, database, cached_range(name, start_date, end_date))] = (fingerprint, result)
+
+
+def read_aggregates_cache(database, fingerprint):
+    """ Cached aggregates by range_key, empty if the cache is missing or out of date """
+    try:
+        with open(aggregates_cache_path(database)) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("fingerprint") != fingerprint:
+        return {}
+    return cache.get("ranges", {})
+
+
+def write_aggregates_cache(database, fingerprint, ranges):
+    path = aggregates_cache_path(database)
+    try:
+        with open(path + ".tmp", "w") as cache_file:
+            json.dump({"fingerprint": fingerprint, "ranges": ranges}, cache_file, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+    except OSError:
+        logging.getLogger(__name__).warning("Could not write the stats cache %s", path)
+
+
+def load_arrays(database):
+    """
+        load_item_arrays and load_rating_arrays for the entire history,
+        read from the cache file if the database has not changed since it was written.
+    """
+    import numpy as np
+    fingerprint = get_fingerprint(database)
+    path = arrays_cache_path(database)
+    try:
+        with np.load(path) as cache:
+            if int(cache["fingerprint"]) == fingerprint:
+                item_arrays = {key[len("items."):]: cache[key] for key in cache.files if key.startswith("items.")}
+                rating_arrays = {key[len("ratings."):]: cache[key] for key in cache.files if key.startswith("ratings.")}
+                return item_arrays, rating_arrays
+    except (OSError, ValueError, KeyError):
+        pass
+
+    con = db_connection.get_manager(database).reader()
+    item_arrays = load_item_arrays(con)
+    rating_arrays = load_rating_arrays(con)
+    contents = {f"items.{key}": value for key, value in item_arrays.items()}
+    contents.update({f"ratings.{key}": value for key, value in rating_arrays.items()})
+    # Names are saved as fixed width strings so the file can be loaded without pickle
+    contents["items.names"] = item_arrays["names"].astype(str)
+    try:
+        with open(path + ".tmp", "wb") as cache_file:
+            np.savez_compressed(cache_file, fingerprint=fingerprint, **contents)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        logging.getLogger(__name__).warning("Could not write the stats cache %s", path)
+    return item_arrays, rating_arrays
+
+
+# --- Cube
+# Weekdays start at Monday like datetime.weekday()
+# Day 0 of datetime64[D], 1970-01-01, was a Thursday
+EPOCH_WEEKDAY = 3
+CUBE_AXES = ("weekday", "hour", "item_type", "item")
+
+
+class StatsCube:
+    """
+        Totals for every combination of weekday, hour of the day, item type
+        and item name, one axis per CUBE_AXES:
+            count: times items were scheduled
+            completable: how many of those were tasks
+            completed: how many of those tasks were completed
+            rated: how many were on a day that was rated
+            rating_sum: sum of the ratings of those days
+
+        Only the cells that have something in them are stored. coords is
+        the index of each of those cells along every axis and each field
+        is an array with one total per cell, so the cube grows with the
+        schedule instead of with weekdays x hours x types x names.
+
+        weekday_ratings is the (rating sum, rated days) of each weekday
+        from the ratings alone, so days with nothing scheduled count too.
+
+        Every slice of the Statistics tab is a sum over the cube's cells,
+        the schedule is never read again.
+    """
+    def __init__(self, names, shape, coords, cells, weekday_ratings):
+        self.names = names
+        # axis: length
+        self.shape = shape
+        self.coords = coords
+        self.cells = cells
+        self.weekday_ratings = weekday_ratings
+        self._slices = {}
+
+    def item_code(self, item_name):
+        """ Index of an item name on the item axis, None if it is not in the cube """
+        import numpy as np
+        code = int(np.searchsorted(self.names, item_name))
+        if code < len(self.names) and self.names[code] == item_name:
+            return code
+        return None
+
+    def slice(self, *axes, **fixed):
+        """
+            Totals that keep the axes named in axes, in that order, with the
+            axes named in fixed set to one index and the rest added up.
+            An item can be fixed by name or by code.
+                cube.slice("hour", item="Exercise", weekday=0)
+            Returns a dict of field: array
+        """
+        import numpy as np
+        item_name = fixed.get("item")
+        if isinstance(item_name, str):
+            fixed["item"] = self.item_code(item_name)
+            if fixed["item"] is None:
+                raise KeyError(f"No item named {item_name!r}")
+        key = (axes, tuple(sorted(fixed.items())))
+        if key not in self._slices:
+            selected = np.ones(len(self.coords["item"]), dtype=bool)
+            for axis, index in fixed.items():
+                selected &= self.coords[axis] == index
+            shape = tuple(self.shape[axis] for axis in axes)
+            if axes:
+                position = np.ravel_multi_index(tuple(self.coords[axis][selected] for axis in axes), shape)
+            else:
+                position = np.zeros(np.count_nonzero(selected), dtype=np.int64)
+            size = int(np.prod(shape))
+            self._slices[key] = {
+                field: np.bincount(position, cells[selected], minlength=size).astype(cells.dtype).reshape(shape)
+                for field, cells in self.cells.items()
+            }
+        return self._slices[key]
+
+    def summary(self, *axes, **fixed):
+        """ Like slice, but with completion rates and mean ratings instead of sums.
+            Cells with nothing to divide by are nan. """
+        import numpy as np
+        totals = self.slice(*axes, **fixed)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "count": totals["count"],
+                "completion_rate": totals["completed"] / totals["completable"],
+                "mean_rating": totals["rating_sum"] / totals["rated"],
+            }
+
+    def most_common(self, **fixed):
+        """ Code of the item scheduled most often with the axes in fixed set,
+            None if nothing was. Ties go to the first name. """
+        count = self.slice("item", **fixed)["count"]
+        code = int(count.argmax()) if len(count) else None
+        if code is None or count[code] == 0:
+            return None
+        return code
+
+    def completion_rates(self, **fixed):
+        """ Codes and completion rates of the items that were completed at least once
+            with the axes in fixed set, lowest rate first. Ties are in name order. """
+        import numpy as np
+        totals = self.slice("item", **fixed)
+        done = np.flatnonzero(totals["completed"])
+        rates = totals["completed"][done] / totals["completable"][done]
+        order = np.argsort(rates, kind="stable")
+        return done[order], rates[order]
+
+    def weekday_mean_ratings(self):
+        import numpy as np
+        rating_sum, rated_days = self.weekday_ratings
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return rating_sum / rated_days
+
+
+def build_cube(item_arrays, rating_arrays):
+    """ Build a StatsCube from load_item_arrays and load_rating_arrays """
+    import numpy as np
+    start = item_arrays["start"]
+    completed = item_arrays["completed"]
+    item_type = item_arrays["item_type"]
+    names = item_arrays["names"]
+    day = start // 1440
+    num_types = int(item_type.max()) + 1 if len(item_type) else 1
+    shape = dict(zip(CUBE_AXES, (7, 24, num_types, len(names))))
+    cell = np.ravel_multi_index(
+        ((day + EPOCH_WEEKDAY) % 7, (start % 1440) // 60, item_type, item_arrays["item_code"]),
+        tuple(shape.values()),
+    )
+    occupied, cell_index = np.unique(cell, return_inverse=True)
+    coords = dict(zip(CUBE_AXES, np.unravel_index(occupied, tuple(shape.values()))))
+
+    # Rating of the day each item was scheduled on, 0 when the day was not rated
+    rating_days = rating_arrays["date"].astype(np.int64)
+    ratings = rating_arrays["rating"]
+    order = np.argsort(rating_days, kind="stable")
+    rating_days, ratings = rating_days[order], ratings[order]
+    if len(rating_days):
+        position = np.minimum(np.searchsorted(rating_days, day), len(rating_days) - 1)
+        rated = rating_days[position] == day
+        day_rating = np.where(rated, ratings[position], 0)
+    else:
+        rated = np.zeros(len(day), dtype=bool)
+        day_rating = np.zeros(len(day), dtype=np.int16)
+
+    field_weights = {
+        "count": None,
+        "completable": completed >= 0,
+        "completed": completed == 1,
+        "rated": rated,
+        "rating_sum": day_rating,
+    }
+    cells = {
+        field: np.bincount(cell_index, weights, minlength=len(occupied)).astype(np.int64)
+        for field, weights in field_weights.items()
+    }
+
+    rating_weekdays = (rating_days + EPOCH_WEEKDAY) % 7
+    weekday_ratings = (
+        np.bincount(rating_weekdays, ratings, minlength=7),
+        np.bincount(rating_weekdays, minlength=7),
+    )
+    return StatsCube(names, shape, coords, cells, weekday_ratings)
+
+
+def load_cube(database, start_date=None, end_date=None, fingerprint=None, arrays=None):
+    """ build_cube for a range, from the cache if the database has not changed.
+        arrays is load_range_arrays for the range if it was already read. """
+    if fingerprint is None:
+        fingerprint = get_fingerprint(database)
+    cube = get_cached("cube", database, start_date, end_date, fingerprint)
+    if cube is None:
+        if arrays is None:
+            arrays = load_range_arrays(database, start_date, end_date)
+        cube = build_cube(*arrays)
+        put_cached("cube", database, start_date, end_date, fingerprint, cube)
+    return cube
+
+
+# --- Trends
+# Everything here works on dense arrays with one element per day, so a
+# window or a streak never needs a groupby. Days are counted from the epoch.
+TREND_WINDOWS = (7, 30)
+
+
+def epoch_day(date):
+    """ Days since 1970-01-01 of a QDate """
+    return date.toJulianDay() - 2440588
+
+
+def daily_totals(item_arrays, rating_arrays, first_day, last_day):
+    """
+        Totals for every day from first_day to last_day (epoch days), with
+        days that have nothing on them as 0:
+            tasks: tasks scheduled
+            completed: tasks completed
+            rated: 1 if the day was rated
+            rating: the rating of the day
+    """
+    import numpy as np
+    num_days = last_day - first_day + 1
+    day = item_arrays["start"] // 1440 - first_day
+    completed = item_arrays["completed"]
+    in_range = (day >= 0) & (day < num_days)
+    tasks = in_range & (completed >= 0)
+    rating_day = rating_arrays["date"].astype(np.int64) - first_day
+    rated = (rating_day >= 0) & (rating_day < num_days)
+    return {
+        "tasks": np.bincount(day[tasks], minlength=num_days),
+        "completed": np.bincount(day[tasks & (completed == 1)], minlength=num_days),
+        "rated": np.bincount(rating_day[rated], minlength=num_days),
+        "rating": np.bincount(rating_day[rated], rating_arrays["rating"][rated], minlength=num_days),
+    }
+
+
+def rolling_sum(values, window):
+    """ Sum of each day and the window - 1 days before it, from one cumulative sum """
+    import numpy as np
+    totals = np.cumsum(values, dtype=np.float64)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals
+
+
+def rolling_ratio(numerator, denominator, window):
+    """ Ratio of the rolling sums, nan for windows where the denominator is 0 """
+    import numpy as np
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return rolling_sum(numerator, window) / rolling_sum(denominator, window)
+
+
+def completion_streaks(item_arrays, last_day):
+    """
+        Longest and current streak of each item: the number of days in a row
+        it was completed on. A streak is current if it reaches last_day or
+        the day before, since last_day may not be over yet.
+        Returns two arrays indexed by item code.
+    """
+    import numpy as np
+    num_items = len(item_arrays["names"])
+    day = item_arrays["start"] // 1440
+    done = (item_arrays["completed"] == 1) & (day <= last_day)
+    # One entry per item and day it was completed, sorted by item then day
+    oldest = int(day[done].min()) if done.any() else last_day
+    span = last_day - oldest + 1
+    pairs = np.unique(item_arrays["item_code"][done].astype(np.int64) * span + (day[done] - oldest))
+    code = pairs // span
+    offset = pairs % span
+    longest = np.zeros(num_items, dtype=np.int64)
+    current = np.zeros(num_items, dtype=np.int64)
+    if len(pairs) == 0:
+        return longest, current
+    # A gap or a new item starts another run of days
+    run_starts = np.ones(len(pairs), dtype=bool)
+    run_starts[1:] = (code[1:] != code[:-1]) | (offset[1:] - offset[:-1] != 1)
+    run_index = np.flatnonzero(run_starts)
+    run_lengths = np.diff(np.append(run_index, len(pairs)))
+    run_codes = code[run_index]
+    np.maximum.at(longest, run_codes, run_lengths)
+    # The last run of an item is its most recent one
+    last_runs = np.append(run_codes[1:] != run_codes[:-1], True)
+    run_ends = oldest + offset[run_index + run_lengths - 1]
+    recent = last_runs & (run_ends >= last_day - 1)
+    current[run_codes[recent]] = run_lengths[recent]
+    return longest, current
+
+
+def build_trends(item_arrays, rating_arrays, start_date=None, end_date=None):
+    """
+        Rolling completion rates and ratings for each of TREND_WINDOWS and
+        the streaks of every item between two QDates. Without a start_date
+        the days start at the oldest item or rating, without an end_date
+        they end today.
+    """
+    import numpy as np
+    last_day = epoch_day(end_date or QDate.currentDate())
+    if start_date is not None:
+        first_day = epoch_day(start_date)
+    else:
+        oldest = [item_arrays["start"].min() // 1440] if len(item_arrays["start"]) else []
+        if len(rating_arrays["date"]):
+            oldest.append(rating_arrays["date"].astype(np.int64).min())
+        first_day = int(min(oldest, default=last_day))
+    first_day = min(first_day, last_day)
+    totals = daily_totals(item_arrays, rating_arrays, first_day, last_day)
+    longest, current = completion_streaks(item_arrays, last_day)
+    return {
+        "days": np.arange(first_day, last_day + 1).astype("datetime64[D]"),
+        "completion": {
+            window: rolling_ratio(totals["completed"], totals["tasks"], window)
+            for window in TREND_WINDOWS
+        },
+        "rating": {
+            window: rolling_ratio(totals["rating"], totals["rated"], window)
+            for window in TREND_WINDOWS
+        },
+        "names": item_arrays["names"],
+        "longest_streak": longest,
+        "current_streak": current,
+    }
+
+
+def load_trends(database, start_date=None, end_date=None, fingerprint=None, arrays=None):
+    """ build_trends for a range, from the cache if the database has not changed.
+        arrays is load_range_arrays for the range if it was already read. """
+    if fingerprint is None:
+        fingerprint = get_fingerprint(database)
+    # Settled once so the trends are built for the day they are cached under
+    last_date = end_date or QDate.currentDate()
+    trends = get_cached("trends", database, start_date, last_date, fingerprint)
+    if trends is None:
+        if arrays is None:
+            arrays = load_range_arrays(database, start_date, end_date)
+        trends = build_trends(*arrays, start_date, last_date)
+        put_cached("trends", database, start_date, last_date, fingerprint, trends)
+    return trends
+
+
+# --- Correlations
+# Items need at least this many rated days with them and without them
+# before their lift is worth showing
+MIN_LIFT_DAYS = 5
+
+
+def build_correlations(item_arrays, rating_arrays):
+    """
+        How the rating of a day goes with each item, for every item at once.
+        The day x item matrix only keeps the (day, item) coordinates of the
+        cells that are set, so it grows with the schedule instead of with
+        days x items. Its products with the ratings are np.bincount calls.
+        Only rated days are counted. Returns a dict of arrays indexed by item code:
+            days: days the item was scheduled on
+            lift: mean rating of those days minus the mean rating of the other days
+            completed_days: days the item was completed on
+            completion_lift: mean rating of the days it was completed minus
+                the mean rating of the days it was scheduled but not completed
+        names, the item names, and rated_days, the number of rated days.
+    """
+    import numpy as np
+    num_items = len(item_arrays["names"])
+    rating_days = rating_arrays["date"].astype(np.int64)
+    order = np.argsort(rating_days, kind="stable")
+    rating_days = rating_days[order]
+    ratings = rating_arrays["rating"][order].astype(np.float64)
+    num_days = len(rating_days)
+
+    day = item_arrays["start"] // 1440
+    if num_days:
+        row = np.minimum(np.searchsorted(rating_days, day), num_days - 1)
+        rated = rating_days[row] == day
+    else:
+        row = np.zeros(len(day), dtype=np.int64)
+        rated = np.zeros(len(day), dtype=bool)
+
+    # One cell per item and rated day, completed if the item was completed at all that day
+    stride = max(num_days, 1)
+    cells, cell_index = np.unique(
+        item_arrays["item_code"][rated].astype(np.int64) * stride + row[rated],
+        return_inverse=True,
+    )
+    cell_done = np.bincount(cell_index, item_arrays["completed"][rated] == 1, minlength=len(cells)) > 0
+    columns = cells // stride
+    cell_rating = ratings[cells % stride]
+
+    days = np.bincount(columns, minlength=num_items)
+    rating_sum = np.bincount(columns, cell_rating, minlength=num_items)
+    completed_days = np.bincount(columns[cell_done], minlength=num_items)
+    completed_sum = np.bincount(columns[cell_done], cell_rating[cell_done], minlength=num_items)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lift = rating_sum / days - (ratings.sum() - rating_sum) / (num_days - days)
+        completion_lift = (
+            completed_sum / completed_days
+            - (rating_sum - completed_sum) / (days - completed_days)
+        )
+    return {
+        "names": item_arrays["names"],
+        "rated_days": num_days,
+        "days": days,
+        "lift": lift,
+        "completed_days": completed_days,
+        "completion_lift": completion_lift,
+    }
+
+
+def top_lifts(correlations, min_days=MIN_LIFT_DAYS):
+    """
+        Item codes ordered from highest lift to lowest, leaving out items
+        that were on fewer than min_days rated days or missing from fewer than that.
+    """
+    import numpy as np
+    num_days = correlations["rated_days"]
+    days = correlations["days"]
+    lift = correlations["lift"]
+    usable = np.flatnonzero((days >= min_days) & (num_days - days >= min_days) & ~np.isnan(lift))
+    return usable[np.argsort(-lift[usable], kind="stable")]
+
+
+def load_correlations(database, start_date=None, end_date=None, fingerprint=None, arrays=None):
+    """ build_correlations for a range, from the cache if the database has not changed.
+        arrays is load_range_arrays for the range if it was already read. """
+    if fingerprint is None:
+        fingerprint = get_fingerprint(database)
+    correlations = get_cached("correlations", database, start_date, end_date, fingerprint)
+    if correlations is None:
+        if arrays is None:
+            arrays = load_range_arrays(database, start_date, end_date)
+        correlations = build_correlations(*arrays)
+        put_cached("correlations", database, start_date, end_date, fingerprint, correlations)
+    return correlations
+
+
+class Aggregates:
+    """
+        The totals shown on the Statistics tab for a range of days.
+        SQLite does the counting so the rows never have to be loaded
+        into pandas.
+    """
+
+    def __init__(self, start_date=None, end_date=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        # (item_type, item_name): [times scheduled, times completed]
+        self.items = {}
+        self.rating_sum = 0
+        self.rated_days = 0
+
+    def copy(self):
+        aggregates = Aggregates(self.start_date, self.end_date)
+        aggregates.items = {key: list(counts) for key, counts in self.items.items()}
+        aggregates.rating_sum = self.rating_sum
+        aggregates.rated_days = self.rated_days
+        return aggregates
+
+    def to_json(self):
+        return {
+            "items": [[item_type, name, count, done] for (item_type, name), (count, done) in self.items.items()],
+            "rating_sum": self.rating_sum,
+            "rated_days": self.rated_days,
+        }
+
+    @classmethod
+    def from_json(cls, start_date, end_date, data):
+        aggregates = cls(start_date, end_date)
+        for item_type, name, count, done in data["items"]:
+            aggregates.add_item(item_type, name, count, done)
+        aggregates.rating_sum = data["rating_sum"]
+        aggregates.rated_days = data["rated_days"]
+        return aggregates
+
+    def add_item(self, item_type, item_name, count, completed):
+        totals = self.items.setdefault((item_type, item_name), [0, 0])
+        totals[0] += count
+        totals[1] += completed
+
+    def is_empty(self):
+        return self.rated_days == 0 or not self.items
+
+    def average_rating(self):
+        if self.rated_days == 0:
+            return None
+        return self.rating_sum / self.rated_days
+
+    def task_completion(self):
+        """ Fraction of all scheduled tasks that were completed """
+        total = completed = 0
+        for (item_type, _), (count, done) in self.items.items():
+            if item_type == 0:
+                total += count
+                completed += done
+        if total == 0:
+            return 0
+        return completed / total
+
+
+def load_aggregates(database, start_date=None, end_date=None):
+    """ Count everything the Statistics tab shows between two QDates (None for no limit) """
+    con = db_connection.get_manager(database).reader()
+    aggregates = Aggregates(start_date, end_date)
+    for row in db_interface.get_item_stats(con, start_date, end_date):
+        aggregates.add_item(row["item_type"], row["item_name"], row["count"], row["completed"])
+    totals = db_interface.get_summary_totals(con, start_date, end_date)
+    aggregates.rating_sum = totals["rating_sum"]
+    aggregates.rated_days = totals["rated_days"]
+    return aggregates
+
+
+class StatsEngine:
+    """
+        Keeps the Aggregates and the arrays of the schedule and ratings for
+        the range of days the Statistics tab is showing, and updates them as
+        the schedule and ratings change.
+
+        The widgets that write to the database report what they changed
+        with row_added, row_removed and day_rated. Nothing is applied until
+        get_stats is called, then only those changes are applied.
+        The database is only read again when the range changes.
+
+        get_stats can be called from a worker thread while the widgets
+        keep writing. Changes have to be reported inside the writer() block,
+        before they are committed. The load starts its read transaction while
+        it holds the writer, so every change reported before that point is
+        already in what it reads and every change reported after it is not.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.aggregates = None
+        # (item_arrays, rating_arrays) for the same range as the aggregates
+        self.arrays = None
+        # Goes up every time the aggregates change so viewers can tell
+        # whether they have to redraw
+        self.version = 0
+        # (number, change) for every change reported, in order
+        self._pending = []
+        self._reported = 0
+        self._lock = threading.Lock()
+        # Only one load at a time, otherwise an older load could replace a newer one.
+        # The aggregates and arrays are only changed while it is held.
+        self._load_lock = threading.Lock()
+
+    def get_stats(self, start_date=None, end_date=None, cancelled=None):
+        """
+            (aggregates, arrays, fingerprint) between two QDates (None for no limit).
+            aggregates is a copy of the Aggregates and arrays is what
+            load_range_arrays returns for the range. The arrays are never
+            changed in place, so they can be kept. fingerprint is the change
+            counter the database had when it held the same rows, so results
+            built from the arrays can be cached with put_cached.
+            cancelled is an optional function that returns True when the caller
+            no longer wants the result. It is checked while the database is
+            being read and stops the query with sqlite3.OperationalError.
+        """
+        manager = db_connection.get_manager(self.database)
+        with self._load_lock:
+            with self._lock:
+                covered = self._covers(start_date, end_date)
+            if not covered:
+                self._load_range(manager, start_date, end_date, cancelled)
+
+            # While the writer is held every change that was reported is committed
+            # and every change that was committed was reported
+            with manager.writer() as con:
+                fingerprint = db_interface.get_change_counter(con)
+                with self._lock:
+                    pending, self._pending = self._pending, []
+            if pending:
+                self._apply_pending(pending)
+            return self.aggregates.copy(), self.arrays, fingerprint
+
+    def _covers(self, start_date, end_date):
+        return (
+            self.aggregates is not None
+            and self.aggregates.start_date == start_date
+            and self.aggregates.end_date == end_date
+        )
+
+    def _load_range(self, manager, start_date, end_date, cancelled):
+        con = manager.reader()
+        if cancelled:
+            con.set_progress_handler(cancelled, 1000)
+        try:
+            with manager.writer():
+                con.execute("BEGIN")
+                # WAL picks what a transaction can see at its first read
+                fingerprint = db_interface.get_change_counter(con)
+                with self._lock:
+                    reported = self._reported
+            try:
+                aggregates = self._load(start_date, end_date, fingerprint)
+                arrays = load_range_arrays(self.database, start_date, end_date)
+            finally:
+                con.commit()
+        finally:
+            if cancelled:
+                con.set_progress_handler(None, 0)
+
+        with self._lock:
+            self.aggregates = aggregates
+            self.arrays = arrays
+            self._pending = [change for change in self._pending if change[0] > reported]
+            self.version += 1
+
+    def _apply_pending(self, pending):
+        rows = collections.Counter()
+        ratings = collections.defaultdict(lambda: (0, 0))
+        for _, change in pending:
+            self._apply(rows, ratings, *change)
+        item_arrays, rating_arrays = self.arrays
+        rows = {key: count for key, count in rows.items() if count}
+        if rows:
+            item_arrays = patch_item_arrays(item_arrays, rows)
+        if ratings:
+            rating_arrays = patch_rating_arrays(rating_arrays, ratings)
+        with self._lock:
+            self.arrays = item_arrays, rating_arrays
+            self.version += 1
+
+    def _load(self, start_date, end_date, fingerprint):
+        """ Get the aggregates from the cache file, or from the database if it has changed """
+        key = range_key(start_date, end_date)
+        ranges = read_aggregates_cache(self.database, fingerprint)
+        if key in ranges:
+            return Aggregates.from_json(start_date, end_date, ranges[key])
+        aggregates = load_aggregates(self.database, start_date, end_date)
+        ranges[key] = aggregates.to_json()
+        write_aggregates_cache(self.database, fingerprint, ranges)
+        return aggregates
+
+    def _in_range(self, day):
+        """ day is an ISO date string """
+        start, end = self.aggregates.start_date, self.aggregates.end_date
+        if start and day < start.toString(Qt.ISODate):
+            return False
+        if end and day > end.toString(Qt.ISODate):
+            return False
+        return True
+
+    def _apply(self, rows, ratings, kind, day, *change):
+        """ Apply a change to the aggregates and add it to the changes
+            for the arrays, rows and ratings as patch_item_arrays and
+            patch_rating_arrays take them """
+        if not self._in_range(day):
+            return
+        if kind == "item":
+            count, key = change
+            _, _, item_type, item_name, completed = key
+            self.aggregates.add_item(item_type, item_name, count, count if completed == 1 else 0)
+            if self.aggregates.items[(item_type, item_name)][0] <= 0:
+                del self.aggregates.items[(item_type, item_name)]
+            rows[key] += count
+        elif kind == "rating":
+            rating_sum, rated_days = change
+            self.aggregates.rating_sum += rating_sum
+            self.aggregates.rated_days += rated_days
+            day = epoch_day(QDate.fromString(day, Qt.ISODate))
+            old_sum, old_days = ratings[day]
+            ratings[day] = (old_sum + rating_sum, old_days + rated_days)
+
+    def _record(self, *change):
+        with self._lock:
+            # Kept even before the first load, a load may already be running
+            self._reported += 1
+            self._pending.append((self._reported, change))
+
+    def row_added(self, row):
+        """ row is a schedule row joined with items, like get_schedule_item returns """
+        self._record("item", row["start"][:10], 1, schedule_key(row))
+
+    def row_removed(self, row):
+        self._record("item", row["start"][:10], -1, schedule_key(row))
+
+    def day_rated(self, day, old_rating, new_rating):
+        """ day is a QDate, either rating can be None """
+        rating_sum = (new_rating or 0) - (old_rating or 0)
+        rated_days = (new_rating is not None) - (old_rating is not None)
+        self._record("rating", day.toString(Qt.ISODate), rating_sum, rated_days)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(database):
+    """ Get the StatsEngine for a database file, creating it the first time """
+    with _engines_lock:
+        engine = _engines.get(database)
+        if engine is None:
+            engine = StatsEngine(database)
+            _engines[database] = engine
+        return engine
+
+
 def main():
     if len(sys.argv) > 1:
         dbf = f"tests/{sys.argv[1]}"
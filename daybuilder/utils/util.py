@@ -19,12 +19,36 @@ weekday_map = {0: "Sunday", 1: "Monday", 2: "Tuesday", 3: "Wednesday", 4: "Thurs
 # Apparently these icons only work in GNOME and KDE
 # So I set fallback icons from the free Silk icon set
 # link: http://www.famfamfam.com/lab/icons/silk/
+# The fallbacks are found relative to the package instead of the working directory
+ICON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backup_icons")
+# name: (theme icon name, fallback file in ICON_DIR)
+ICONS = {
+    "edit": ("edit", "note_edit.png"),
+    "save": ("document-save", "disk.png"),
+    "cancel": ("document-revert", "arrow_undo.png"),
+    "delete": ("edit-delete", "cancel.png"), # cancel icon is being used as delete intentionally
+    "back": ("media-seek-backward", "arrow_left.png"),
+    "forward": ("media-seek-forward", "arrow_right.png"),
+    "new_date": ("appointment-new", "calendar.png"),
+}
+# Every ScheduleItem uses four icons, so each one is looked up once
+# and the same QIcon is shared by every widget
+_icons = {}
+
 # ok so I'm making these functions because I was getting an error
 # saying 'Must construct a QGuiApplication before a QPixMap
-def edit_icon():  return QIcon.fromTheme("edit", QIcon(os.path.join("backup_icons", "note_edit.png")))
-def save_icon(): return QIcon.fromTheme("document-save", QIcon(os.path.join("backup_icons", "disk.png")))
-def cancel_icon(): return QIcon.fromTheme("document-revert", QIcon(os.path.join("backup_icons", "arrow_undo.png")))
-def delete_icon(): return QIcon.fromTheme("edit-delete", QIcon(os.path.join("backup_icons", "cancel.png"))) # cancel icon is being used as delete intentionally
-def back_icon(): return QIcon.fromTheme("media-seek-backward", QIcon(os.path.join("backup_icons", "arrow_left.png")))
-def forward_icon(): return QIcon.fromTheme("media-seek-forward", QIcon(os.path.join("backup_icons", "arrow_right.png")))
-def new_date_icon(): return QIcon.fromTheme("appointment-new", QIcon(os.path.join("backup_icons", "calendar.png")))
+def icon(name):
+    cached = _icons.get(name)
+    if cached is None:
+        theme_name, file_name = ICONS[name]
+        cached = QIcon.fromTheme(theme_name, QIcon(os.path.join(ICON_DIR, file_name)))
+        _icons[name] = cached
+    return cached
+
+def edit_icon(): return icon("edit")
+def save_icon(): return icon("save")
+def cancel_icon(): return icon("cancel")
+def delete_icon(): return icon("delete")
+def back_icon(): return icon("back")
+def forward_icon(): return icon("forward")
+def new_date_icon(): return icon("new_date")
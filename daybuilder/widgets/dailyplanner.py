@@ -1,11 +1,11 @@
 from collections import defaultdict
 from daybuilder.widgets.rating import DailyRating
-from daybuilder.widgets import scheduleitem
-from daybuilder.utils import db_interface, util
+from daybuilder.widgets import schedule_list, scheduleitem
+from daybuilder.utils import day_cache, db_connection, db_interface, item_index, layout, stats, util
 import logging
 import os
 import sqlite3
-from PyQt5.QtCore import Qt, pyqtSignal, QDate, QTime, QDateTime
+from PyQt5.QtCore import Qt, pyqtSignal, QDate, QTime, QDateTime, QStringListModel
 from PyQt5.QtWidgets import (
     QMainWindow,
     QApplication,
@@ -29,6 +29,7 @@ from PyQt5.QtWidgets import (
     QCheckBox,
     QMessageBox,
     QSizePolicy,
+    QCompleter,
 )
 import sys
 
@@ -37,6 +38,9 @@ logging.basicConfig()
 # Globals
 DATE_LABEL_FORMAT = "%A, %B %d %Y"
 QDATE_LABEL_FORMAT = "ddd, MMM d yyyy"
+# Days with more items than this are shown in a ScheduleList instead of
+# giving every item its own widget
+DENSE_DAY = 100
 
 # This is a useful function but I'm not sure where it belongs yet
 # def load_schedule(self):
@@ -53,6 +57,9 @@ class DailyPlanner(QWidget):
     def __init__(self, db, *args, **kwargs):
         super(DailyPlanner, self).__init__(*args, **kwargs)
         self.db = db
+        self.connections = db_connection.get_manager(self.db)
+        self.stats_engine = stats.get_engine(self.db)
+        self.day_cache = day_cache.get_cache(self.db)
         self.grid = QGridLayout(self)
 
         self.setWindowTitle("Day Builder")
@@ -85,28 +92,51 @@ class DailyPlanner(QWidget):
         self.schedule_area.fix_scroll_area()
         new_rating = self.get_rating()
         self.daily_rating.refresh(new_rating, self.view_date)
+        # Read the next and previous days while the user looks at this one
+        self.day_cache.prefetch(self.view_date)
 
     def get_rating(self):
-        with sqlite3.connect(self.db) as con:
-            rating = db_interface.get_rating_by_date(con, self.view_date)
+        rating = self.day_cache.get(self.view_date).rating
         return rating
 
     def save_rating(self, rating):
         if rating == -1:
             return
-        with sqlite3.connect(self.db) as con:
-            if db_interface.get_rating_by_date(con, self.view_date):
+        with self.connections.writer() as con:
+            old_rating = db_interface.get_rating_by_date(con, self.view_date)
+            if old_rating:
                 db_interface.update_rating_row(con, self.view_date, rating)
             else:
                 db_interface.insert_rating_row(con, self.view_date, rating)
+            # Tell the stats engine before the change is committed, see StatsEngine
+            self.stats_engine.day_rated(self.view_date, old_rating, rating)
+        self.day_cache.invalidate(self.view_date)
 
 
 class ScheduleArea(QWidget):
+    """
+        Shows the schedule for one day.
+        The widgets on screen are kept in a model keyed by active_id so
+        changes to the day can be applied one widget at a time.
+        The whole day is only rebuilt when the date changes.
+
+        Days with more than DENSE_DAY items are shown in a ScheduleList
+        instead, which only paints the rows that are on screen.
+    """
     def __init__(self, db, *args, **kwargs):
         super(ScheduleArea, self).__init__(*args, **kwargs)
         self.vbox = QVBoxLayout(self)
         self.db = db
-        self.items = []
+        self.connections = db_connection.get_manager(self.db)
+        self.stats_engine = stats.get_engine(self.db)
+        self.day_cache = day_cache.get_cache(self.db)
+        self.view_date = None
+        # active_id: ScheduleItem on screen
+        self.items = {}
+        # active_id: the row the ScheduleItem is showing
+        self.rows = {}
+        # active_id: active_id of the item it is shown inside of, None for the content_grid
+        self.placed = {}
         self.contents = QWidget()
         self.contents.setProperty("id", "schedule-area")
         self.content_grid = QVBoxLayout(self.contents)
@@ -121,48 +151,101 @@ class ScheduleArea(QWidget):
         self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.scroll_area.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.scroll_area.setWidget(self.contents)
+        # Widgets of items that are taken off screen are kept for the next day
+        self.pool = scheduleitem.ItemPool(self.contents, self.connect_item)
+
+        self.dense = False
+        self.schedule_list = schedule_list.ScheduleList()
+        self.schedule_list.delegate.updated.connect(self.update_item)
+        self.schedule_list.delegate.deleted.connect(self.delete_item)
+        self.schedule_list.schedule_model.completion_changed.connect(self.set_completed)
+        self.schedule_list.hide()
 
         self.vbox.addWidget(self.scroll_area)
+        self.vbox.addWidget(self.schedule_list)
+
+    def connect_item(self, item):
+        item.updated.connect(self.update_item)
+        item.deleted.connect(self.delete_item)
+        if isinstance(item, scheduleitem.Task):
+            item.completion_changed.connect(self.set_completed)
+
+    def create_item(self, row):
+        item = self.pool.take(row)
+        self.items[row['active_id']] = item
+        self.rows[row['active_id']] = row
+        return item
+
+    def load_schedule(self, rows=None):
+        """ Create the widgets, or fill the ScheduleList, for the rows of the view_date.
+            The rows are read from the day_cache unless they are given. """
+        self.items = {}
+        self.rows = {}
+        self.placed = {}
+        if rows is None:
+            rows = self.day_cache.get(self.view_date).rows
+        self.dense = len(rows) > DENSE_DAY
+        self.scroll_area.setVisible(not self.dense)
+        self.schedule_list.setVisible(self.dense)
+        if self.dense:
+            self.schedule_list.schedule_model.set_rows(rows)
+            return
+        self.schedule_list.schedule_model.set_rows([])
+        for row in rows:
+            self.create_item(row)
+
+    def intervals(self):
+        for active_id, row in self.rows.items():
+            start = layout.minutes(row['start'])
+            yield layout.Interval(active_id, row['item_type'], start, start + row['duration'])
 
-    def load_schedule(self):
-        self.items = []
-        with sqlite3.connect(self.db) as con:
-            con.row_factory = sqlite3.Row
-            rows = db_interface.get_schedule_by_date(con, self.view_date)
-            for row in rows:
-                item = scheduleitem.create_schedule_item(row)
-                item.updated.connect(self.update_item)
-                item.deleted.connect(self.delete_item)
-                self.items.append(item)
-
-    def display_items(self):
-        """ This will need huge reworks to make it so it is placing
-        the widgets in a more regular and aesthetic fashion
-        So this function is terrible because it's 12am and I just realized I messed it up by switching to a vbox from a grid and I am just trying to make it work since the project is due tomorrow morning
+    def display_items(self, moved=()):
         """
-        NUM_COLS = 3
-        NUM_ROWS = 24 * 4  # The grid will have 4 rows for every hour
+            Move the widgets to where layout.nest says they go.
+            Tasks within a timeframe go inside of it, everything else
+            goes in the content_grid in order of start time.
+
+            Widgets that are already in the right container are left alone,
+            so only new widgets and the ones in moved (active_ids of items
+            whose times changed) are put in place.
+        """
+        if self.dense:
+            return
         if len(self.items) == 0:
             self.display_no_items()
+            return
+        if self.empty_message.isVisible():
+            self.empty_message.hide()
+        placements = layout.nest(self.intervals())
+        parents = layout.parents(placements)
+        for active_id in list(self.placed):
+            if active_id in moved or self.placed[active_id] != parents[active_id]:
+                self.detach(active_id)
+        # Everything left is in the right order, so going through the
+        # placements in order means every index is right when it is used
+        for index, placement in enumerate(placements):
+            item = self.items[placement.key]
+            if placement.key not in self.placed:
+                # The empty message is always the first widget in the content_grid
+                self.content_grid.insertWidget(index + 1, item)
+                # Items from the pool are hidden until they are in place,
+                # otherwise they flash in the corner of the pool's parent
+                item.show()
+                self.placed[placement.key] = None
+            for child_index, child_id in enumerate(placement.children):
+                if child_id not in self.placed:
+                    item.insert_child(child_index, self.items[child_id])
+                    self.items[child_id].show()
+                    self.placed[child_id] = placement.key
+
+    def detach(self, active_id):
+        """ Take an item out of the content_grid or the item it is inside of """
+        parent_id = self.placed.pop(active_id)
+        item = self.items[active_id]
+        if parent_id is None:
+            self.content_grid.removeWidget(item)
         else:
-            if self.empty_message.isVisible():
-                self.empty_message.hide()
-            # get timeframes
-            qeue = []
-            for item in sorted(self.items, key=lambda i: i.start_time):
-                if item.item_type == 1:
-                    qeue.append(item)
-                elif item.item_type == 0:
-                    plotted = False
-                    for other_item in self.items:
-                        if other_item.item_type == 1 and item.overlaps(other_item) == -2:
-                            plotted = True
-                            other_item.add_task(item)
-                            break
-                    if not plotted:
-                        qeue.append(item)
-            for widget in qeue:
-                self.content_grid.addWidget(widget)
+            self.items[parent_id].remove_child(item)
 
     def fix_scroll_area(self):
         """ Set the scroll area to scroll to the top
@@ -189,55 +272,136 @@ class ScheduleArea(QWidget):
     #      For some reasons those messages only appeared when using
     #      kvantum themes.
     #
-    #      I suppose it makes sense, because None is certainly not a valid window.
-    #
-    #      Using deleteLater here means the program is more wasteful when
-    #      updating an item.
-    #      the update_item method calls refresh which calls clear_view.
-    #      Previously it wasn't as bad because the widgets were not deleted, they
-    #      just didn't have a parent. You could immediately call display_items after
-    #      clear_view because you still had the widgets in a list.
-    #      Now the widgets get deleted so the refresh method has to call load_schedule
-    #      after clear_view every time.
-    #
-    #      So now doing something as simple as marking a task as complete deletes the
-    #      entire schedule and you have to access the database to rebuild the items
-    #
-    #      Additionally, tasks calling the update_item method when they are marked as complete
-    #      is wasteful on it's own. The only reason I do that is because it was faster at the time.
-    #      The update_item method calls refresh because it is used when any scheudle item is updated,
-    #      regardless of the reason, and in the event of updating an item time, it may require the
-    #      items to be rearranged.
-    #
-    #      Fortunately this app takes place on a small enough scale that this doesn't matter.
-    #
-    #      The alternative to this is writing an algorithm that checks each items times to see if
-    #      they need to be reordered after an update.
-    #      And maybe making a different method that only marks an item as complete.
-    #
-    #      I'll keep this in mind when I do a rewrite.
+    #      Deleting every widget used to happen on every update, even marking
+    #      a task as complete. Now clear_view is only used when the date changes,
+    #      and the widgets go back to self.pool to show the next day's items.
+    #      Only the ones that do not fit in the pool are deleted.
+    #      Everything else goes through the model: update_row and remove_item
+    #      change one widget, and sync works out which widgets to create,
+    #      change or remove by comparing the day in the database to the model.
+    #      New items always come in through sync.
 
     def clear_view(self):
         logging.debug("Before delete: %d", self.content_grid.count())
-        for i in reversed(range(self.content_grid.count())):
-            if self.content_grid.itemAt(i).widget() is not self.empty_message:
-                self.content_grid.itemAt(i).widget().deleteLater()
+        for active_id in list(self.items):
+            self.discard(active_id)
         logging.debug("After delete: %d", self.content_grid.count())
+        logging.debug("Item pool: %s", self.pool.stats())
+
+    def discard(self, active_id):
+        """ Take an item's widget off screen without rearranging the rest """
+        item = self.items[active_id]
+        # The tasks inside of it are put somewhere else by display_items
+        for child in list(getattr(item, 'child_items', [])):
+            self.detach(child.id)
+        if active_id in self.placed:
+            self.detach(active_id)
+        del self.items[active_id]
+        del self.rows[active_id]
+        self.pool.release(item)
+
+    def remove_item(self, active_id):
+        if self.dense:
+            self.schedule_list.schedule_model.remove(active_id)
+            return
+        self.discard(active_id)
+        self.display_items()
+
+    def set_row(self, row):
+        """ Show the new values of a row in the widget that is already on screen.
+            Returns True if the item's times changed. """
+        active_id = row['active_id']
+        old_row = self.rows[active_id]
+        self.rows[active_id] = row
+        self.items[active_id].update_data(
+            QDateTime.fromString(row['start'], Qt.ISODate),
+            row['duration'],
+            row['description'],
+            row['completed'],
+        )
+        return old_row['start'] != row['start'] or old_row['duration'] != row['duration']
+
+    def update_row(self, row):
+        active_id = row['active_id']
+        if row['start'][:10] != self.view_date.toString(Qt.ISODate):
+            # Moved to another day
+            self.remove_item(active_id)
+        elif self.dense:
+            self.schedule_list.schedule_model.update_row(row)
+        elif self.set_row(row):
+            self.display_items(moved={active_id})
+
+    def sync(self):
+        """ Compare the day in the database to the model and only change what is different """
+        rows = db_interface.get_schedule_by_date(self.connections.reader(), self.view_date)
+        if (len(rows) > DENSE_DAY) != self.dense:
+            # The day went over or under DENSE_DAY, so it has to be shown the other way
+            self.clear_view()
+            self.load_schedule(rows)
+            self.display_items()
+            return
+        if self.dense:
+            self.schedule_list.schedule_model.sync(rows)
+            return
+        new_rows = {row['active_id']: row for row in rows}
+        moved = set()
+        for active_id in list(self.items):
+            if active_id not in new_rows or self.rows[active_id]['item_id'] != new_rows[active_id]['item_id']:
+                self.discard(active_id)
+        for active_id, row in new_rows.items():
+            old_row = self.rows.get(active_id)
+            if old_row is None:
+                self.create_item(row)
+            elif not db_interface.same_row(old_row, row) and self.set_row(row):
+                moved.add(active_id)
+        self.display_items(moved)
 
     def delete_item(self, active_id):
-        with sqlite3.connect(self.db) as con:
+        with self.connections.writer() as con:
+            old_row = db_interface.get_schedule_item(con, active_id)
             db_interface.delete_schedule_item(con, active_id)
-        self.refresh()
+            self.stats_engine.row_removed(old_row)
+        self.day_cache.invalidate_rows(old_row)
+        self.remove_item(active_id)
 
     def update_item(self, args):
-        with sqlite3.connect(self.db) as con:
+        active_id = args[0]
+        with self.connections.writer() as con:
+            old_row = db_interface.get_schedule_item(con, active_id)
             db_interface.update_schedule_item(con, *args)
-        self.refresh()
+            new_row = db_interface.get_schedule_item(con, active_id)
+            self.stats_engine.row_removed(old_row)
+            self.stats_engine.row_added(new_row)
+        self.day_cache.invalidate_rows(old_row, new_row)
+        self.update_row(new_row)
+
+    def set_completed(self, active_id, completed):
+        """ Check a task off or on.
+            Only the completed column changes, so the row is written with one UPDATE
+            and the checkbox is set in place without moving anything.
+            The daily_summary table is kept up to date by its trigger. """
+        old_row = (self.schedule_list.schedule_model.rows if self.dense else self.rows)[active_id]
+        # Nothing else in the row changes, so it is not read again
+        new_row = dict(old_row)
+        new_row['completed'] = int(completed)
+        with self.connections.writer() as con:
+            db_interface.mark_task_complete(con, active_id, completed)
+            self.stats_engine.row_removed(old_row)
+            self.stats_engine.row_added(new_row)
+        self.day_cache.invalidate_rows(new_row)
+        if self.dense:
+            self.schedule_list.schedule_model.update_row(new_row)
+        else:
+            self.rows[active_id] = new_row
+            self.items[active_id].set_completed(completed)
 
     def refresh(self, new_date=None):
+        """ Rebuild the schedule for a new date, otherwise bring the current day up to date """
+        if new_date is None or new_date == self.view_date:
+            self.sync()
+            return
         self.clear_view()
-        if new_date:
-            self.view_date = new_date
+        self.view_date = new_date
         self.load_schedule()
         self.display_items()
 
@@ -308,9 +472,13 @@ class Planner(QWidget):
     def __init__(self, db, *args, **kwargs):
         super(Planner, self).__init__(*args, **kwargs)
         self.db = db
+        self.connections = db_connection.get_manager(self.db)
 
         self.stack = QStackedLayout(self)
-        self.form = ScheduleForm(db)
+        # Every item with its use count and last use, see item_index.ItemIndex.
+        # The buttons are kept in its order and the form's name completer searches it.
+        self.index = item_index.ItemIndex()
+        self.form = ScheduleForm(db, self.index)
         self.form.item_planned.connect(self.update_plans)
 
         self.selection = QWidget()
@@ -324,6 +492,11 @@ class Planner(QWidget):
         template_label = QLabel("Quick Reuse")
         template_label.setProperty("font-class", "sub-heading")
 
+        self.template_filter = QLineEdit()
+        self.template_filter.setPlaceholderText("Search by name")
+        self.template_filter.setClearButtonEnabled(True)
+        self.template_filter.textChanged.connect(self.filter_templates)
+
         self.template_container = QWidget()
         self.template_vbox = QVBoxLayout(self.template_container)
         self.template_vbox.setAlignment(Qt.AlignTop)
@@ -336,14 +509,12 @@ class Planner(QWidget):
             type_container = QGroupBox(title=type_name+'s')
             type_container.setFlat(True)
             type_container.setProperty("qclass", "item-type-title")
-            layout = QVBoxLayout(type_container)
+            type_layout = QVBoxLayout(type_container)
             self.template_vbox.addWidget(type_container)
-            self.template_map[type_id] = layout
+            self.template_map[type_id] = type_layout
 
 
-        # TODO: implement controls that let you sort and filter the
-        # list of templates.
-        # Sort by date used, alphabetically, tags, let the user search by name
+        # TODO: implement controls that let you sort the list of templates by tags
         self.template_control_container = QWidget()
         self.template_control_vbox = QHBoxLayout(self.template_control_container)
         self.template_control_vbox.setAlignment(Qt.AlignCenter)
@@ -353,17 +524,21 @@ class Planner(QWidget):
         self.sortby_alpha.clicked.connect(self.display_templates)
         self.sortby_count = QRadioButton("by count")
         self.sortby_count.clicked.connect(self.display_templates)
+        self.sortby_recent = QRadioButton("by last used")
+        self.sortby_recent.clicked.connect(self.display_templates)
         self.sort_reversed = QCheckBox("reverse")
         self.sort_reversed.clicked.connect(self.display_templates)
 
         self.template_control_vbox.addWidget(sort_label)
         self.template_control_vbox.addWidget(self.sortby_alpha)
         self.template_control_vbox.addWidget(self.sortby_count)
+        self.template_control_vbox.addWidget(self.sortby_recent)
         self.template_control_vbox.addWidget(self.sort_reversed)
 
         sort_label.setProperty("font-class", "detail")
         self.sortby_alpha.setProperty("font-class", "detail")
         self.sortby_count.setProperty("font-class", "detail")
+        self.sortby_recent.setProperty("font-class", "detail")
         self.sort_reversed.setProperty("font-class", "detail")
 
         self.new_item = QPushButton("New Plan")
@@ -372,6 +547,7 @@ class Planner(QWidget):
 
         self.vbox.addWidget(self.new_item)
         self.vbox.addWidget(template_label)
+        self.vbox.addWidget(self.template_filter)
         self.vbox.addWidget(self.template_scroll_area)
         self.vbox.addWidget(self.template_control_container)
         self.init_templates()
@@ -385,37 +561,85 @@ class Planner(QWidget):
         self.stack.setCurrentWidget(self.form)
 
     def update_plans(self, item_is_new, active_id):
-        with sqlite3.connect(self.db) as con:
-            con.row_factory = sqlite3.Row
-            new_row = db_interface.get_schedule_item(con, active_id)
-            if item_is_new:
-                self.append_template(new_row)
+        """ The form has already counted the use in self.index, so the button only has to move """
+        new_row = db_interface.get_schedule_item(self.connections.reader(), active_id)
+        template = self.template_lookup.get((new_row['item_type'], new_row['item_name']))
+        if template is None:
+            # A new item, or one that exists but was not in the schedule
+            self.append_template(new_row['item_type'], new_row['item_name'])
+        else:
+            template.show_count()
+            self.place_template(template)
         self.lower_form()
         self.item_scheduled.emit()
 
     def load_templates(self):
-        self.templates = []
-        with sqlite3.connect(self.db) as con:
-            con.row_factory = sqlite3.Row
-            rows = db_interface.get_templates(con)
-            for row in rows:
-                template = TemplateButton(row)
-                template.clicked.connect(self.item_from_template)
-                self.templates.append(template)
+        self.template_lookup = {}
+        self.index.load(db_interface.get_item_uses(self.connections.reader()))
+        # Only items that are in the schedule get a button
+        for item in self.index.items.values():
+            if item.count:
+                self.create_template(item.item_type, item.name)
+        self.shown_templates = set(self.template_lookup)
+
+    def create_template(self, item_type, item_name):
+        template = TemplateButton(self.index, item_type, item_name)
+        template.clicked.connect(self.item_from_template)
+        self.template_lookup[(item_type, item_name)] = template
+        return template
+
+    def sort_order(self):
+        """ The item_index sort the buttons are in and whether it is descending """
+        reverse = self.sort_reversed.isChecked()
+        if self.sortby_count.isChecked():
+            return "count", not reverse
+        elif self.sortby_recent.isChecked():
+            return "last_used", not reverse
+        return "name", reverse
 
     def display_templates(self):
-        if self.sortby_alpha.isChecked():
-            self.templates = sorted(self.templates, key=lambda t: t.text(), reverse=self.sort_reversed.isChecked())
-        elif self.sortby_count.isChecked():
-            self.templates = sorted(self.templates, key=lambda t: t.count, reverse=not self.sort_reversed.isChecked())
-        for template in self.templates:
-            self.template_map[template.item_type].addWidget(template)
-
-    def append_template(self, row):
-        template = TemplateButton(row)
-        template.clicked.connect(self.item_from_template)
-        self.templates.append(template)
-        self.display_templates()
+        """ Put every button in order, used when the sort order changes """
+        sort, descending = self.sort_order()
+        for type_id, type_layout in self.template_map.items():
+            for name in self.index.ordered(type_id, sort, descending):
+                type_layout.addWidget(self.template_lookup[(type_id, name)])
+
+    def place_template(self, template):
+        """ Move one button to where it goes in the current sort order """
+        sort, descending = self.sort_order()
+        position = self.index.position(template.item_type, template.text(), sort)
+        if descending:
+            position = self.index.size(template.item_type) - 1 - position
+        type_layout = self.template_map[template.item_type]
+        type_layout.removeWidget(template)
+        type_layout.insertWidget(position, template)
+
+    def filter_templates(self, text):
+        """ Only show the buttons whose names contain text.
+            Buttons that are already shown or hidden are left alone. """
+        if text:
+            # The index also has the items without a button
+            matches = self.index.search(text) & self.template_lookup.keys()
+        else:
+            matches = set(self.template_lookup)
+        # Showing a widget lays out every visible widget above it again,
+        # which made clearing the search take seconds with thousands of buttons.
+        # The container is hidden so the layout only happens once, when it is shown again.
+        self.template_container.hide()
+        for key in self.shown_templates - matches:
+            self.template_lookup[key].hide()
+        for key in matches - self.shown_templates:
+            self.template_lookup[key].show()
+        self.template_container.show()
+        self.shown_templates = matches
+
+    def append_template(self, item_type, item_name):
+        template = self.create_template(item_type, item_name)
+        self.place_template(template)
+        if self.template_filter.text().casefold() in template.text().casefold():
+            self.shown_templates.add((template.item_type, template.text()))
+        else:
+            template.hide()
 
     def init_templates(self):
         self.load_templates()
@@ -429,21 +653,23 @@ class Planner(QWidget):
 
 
 class TemplateButton(QPushButton):
+    """ Button for an item in an ItemIndex, which has its count and last_used """
     clicked = pyqtSignal(tuple)
 
-    def __init__(self, row, *args, **kwargs):
+    def __init__(self, index, item_type, item_name, *args, **kwargs):
         super(TemplateButton, self).__init__(*args, **kwargs)
         self.setProperty("qclass", "template-button")
-        self.setText(row['item_name'])
-        self.item_type = int(row['item_type'])
-        try:
-            self.count = int(row['count'])
-        except IndexError:
-            self.count = 1
-        self.setToolTip(str(self.count))
-        # TODO: the db_interface needs to be fixed to get the last_used
-        # date
-        #self.last_used= datetime.fromisoformat(row['start'])
+        self.index = index
+        self.setText(item_name)
+        self.item_type = int(item_type)
+        self.show_count()
+
+    def item(self):
+        return self.index.get(self.item_type, self.text())
+
+    def show_count(self):
+        """ Update the tooltip, call after the index counts another use """
+        self.setToolTip(str(self.item().count))
 
     def mousePressEvent(self, click_event):
         self.clicked.emit((self.item_type, self.text()))
@@ -451,9 +677,12 @@ class TemplateButton(QPushButton):
 class ScheduleForm(QWidget):
     """ Form that gets Schedule Item info from user """
     item_planned = pyqtSignal(bool, int)
-    def __init__(self, db, *args, **kwargs):
+    def __init__(self, db, index, *args, **kwargs):
         super(ScheduleForm, self).__init__(*args, **kwargs)
         self.db = db
+        self.connections = db_connection.get_manager(self.db)
+        self.stats_engine = stats.get_engine(self.db)
+        self.day_cache = day_cache.get_cache(self.db)
         self.grid = QGridLayout(self)
 
         self.item_type_container = QGroupBox("*Item Type:")
@@ -468,6 +697,17 @@ class ScheduleForm(QWidget):
 
         name_label = QLabel("*Name:")
         self.name_entry = QLineEdit()
+        # Suggest names that are already used so the same thing is not
+        # saved under two names, which would split its stats.
+        # The index belongs to the Planner, submit_data counts new uses in it.
+        self.item_index = index
+        self.name_completer = QCompleter(self)
+        self.name_completer.setModel(QStringListModel(self.name_completer))
+        # The suggestions are already filtered and ranked by suggest_names
+        self.name_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.name_completer.setWidget(self.name_entry)
+        self.name_completer.activated[str].connect(self.name_entry.setText)
+        self.name_entry.textEdited.connect(self.suggest_names)
         description_label = QLabel("Description:")
         self.description_entry = QTextEdit()
         tags_label = QLabel("Tags:")
@@ -501,6 +741,17 @@ class ScheduleForm(QWidget):
 
         self.grid.setAlignment(description_label, Qt.AlignTop)
 
+    def suggest_names(self, text):
+        item_type = self.item_type_buttons.checkedId()
+        names = []
+        if text:
+            names = self.item_index.suggest(text, None if item_type == -1 else item_type)
+        self.name_completer.model().setStringList(names)
+        if names:
+            self.name_completer.complete()
+        else:
+            self.name_completer.popup().hide()
+
     def end_time_checked(self):
         if self.end_time_checkbox.isChecked():
             self.end.setDisabled(False)
@@ -508,6 +759,8 @@ class ScheduleForm(QWidget):
             self.end.setDisabled(True)
 
     def reset(self, active_date):
+        # When the form is first opened instead of on the first keystroke
+        self.item_index.build_trigrams()
         if self.item_type_buttons.checkedButton():
             self.item_type_buttons.checkedButton().setChecked(False)
         self.name_entry.clear()
@@ -552,7 +805,7 @@ class ScheduleForm(QWidget):
         self.submit_data(item_type, item_name, tags, description, QDateTime(qday, start_time), duration)
 
     def submit_data(self, item_type, item_name, tags, description, start, duration):
-        with sqlite3.connect(self.db) as con:
+        with self.connections.writer() as con:
             new_item = not db_interface.item_exists(con, item_type, item_name)
             try:
                 active_id = db_interface.create_schedule_item(
@@ -565,9 +818,17 @@ class ScheduleForm(QWidget):
                                                           duration
                                                          )
             except db_interface.TimeOverlapError:
-                msg = QMessageBox()
-                msg.warning(self, "Invalid Time", "That items time conflicted with another planned item of the same type")
-                return
+                active_id = None
+            else:
+                new_row = db_interface.get_schedule_item(con, active_id)
+                self.stats_engine.row_added(new_row)
+        # The warning waits for the user, so it is shown after the writer is released
+        if active_id is None:
+            msg = QMessageBox()
+            msg.warning(self, "Invalid Time", "That items time conflicted with another planned item of the same type")
+            return
+        self.day_cache.invalidate_rows(new_row)
+        self.item_index.used(item_type, item_name, new_row['start'])
 
         self.item_planned.emit(new_item, active_id)
 
@@ -1,6 +1,6 @@
 from calendar import monthrange
-from collections import defaultdict
-from daybuilder.utils import db_interface, util
+from collections import defaultdict, OrderedDict
+from daybuilder.utils import db_connection, db_interface, util
 import datetime
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QBrush, QPalette, QPainter, QColor
@@ -14,33 +14,56 @@ DATE_EDIT_FORMAT = "MMM d, yyyy"
 BLOCK_DATE_FORMAT = "MM/dd/yy"
 UTF8_CHECKMARK = '\u2714'
 UTF8_X = '\u2718'
+# Number of weeks and months whose summaries are kept in memory
+PERIOD_CACHE_SIZE = 48
+# Each DayBlock's color comes from its rating property.
+# Setting a stylesheet on every block made Qt parse and polish it again each time.
+RATING_STYLES = "\n".join(
+    f'QWidget[qclass=dayblock][rating="{rating}"] {{ background-color: {color}; }}'
+    for rating, color in util.rating_color_map.items()
+)
 
 class DayBlock(QWidget):
-    def __init__(self, view_type, day, rating, total_tasks, completed_tasks, *args, **kwargs):
+    """ Shows the tasks and rating of one day.
+        HistoryView keeps its blocks and calls set_day to show a different day. """
+    def __init__(self, view_type, *args, **kwargs):
         super(DayBlock, self).__init__(*args, **kwargs)
         self.setProperty("qclass", "dayblock")
+        self.setProperty("rating", str(None))
         self.layout = QVBoxLayout(self)
+        self.weekday_label = None
         if view_type == "Weekly":
-            weekday_label = QLabel(f'{day.toString("dddd"):<12}')
-            weekday_label.setProperty("font-class", "block-weekday")
-            self.layout.addWidget(weekday_label)
-        date_label = QLabel(day.toString(BLOCK_DATE_FORMAT))
-        date_label.setProperty("font-class", "sub-heading")
-        task_string = f'{UTF8_CHECKMARK} {completed_tasks}\n' + \
-                      f'{UTF8_X} {total_tasks - completed_tasks}'
-        task_label = QLabel(task_string)
-        task_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        task_label.setProperty("font-class", "content")
+            self.weekday_label = QLabel()
+            self.weekday_label.setProperty("font-class", "block-weekday")
+            self.layout.addWidget(self.weekday_label)
+        self.date_label = QLabel()
+        self.date_label.setProperty("font-class", "sub-heading")
+        self.task_label = QLabel()
+        self.task_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.task_label.setProperty("font-class", "content")
 
         # Not including a rating label and instead making a legend
         #rating_label = QLabel(f"Rating: {util.rating_value_map[rating]}")
         #rating_label.setProperty("font-class", "detail")
-        self.setStyleSheet(f"background-color: {util.rating_color_map[rating]}")
 
-        self.layout.addWidget(date_label)
-        self.layout.addWidget(task_label)
-        self.layout.setAlignment(date_label, Qt.AlignTop)
-        self.layout.setAlignment(task_label, Qt.AlignCenter)
+        self.layout.addWidget(self.date_label)
+        self.layout.addWidget(self.task_label)
+        self.layout.setAlignment(self.date_label, Qt.AlignTop)
+        self.layout.setAlignment(self.task_label, Qt.AlignCenter)
+
+    def set_day(self, day, rating, total_tasks, completed_tasks):
+        if self.weekday_label is not None:
+            self.weekday_label.setText(f'{day.toString("dddd"):<12}')
+        self.date_label.setText(day.toString(BLOCK_DATE_FORMAT))
+        task_string = f'{UTF8_CHECKMARK} {completed_tasks}\n' + \
+                      f'{UTF8_X} {total_tasks - completed_tasks}'
+        self.task_label.setText(task_string)
+        if self.property("rating") != str(rating):
+            # Only this block is polished again, to pick up the RATING_STYLES rule for its rating
+            self.setProperty("rating", str(rating))
+            self.style().unpolish(self)
+            self.style().polish(self)
+            self.update()
 
 
     def paintEvent(self, pain_event):
@@ -55,6 +78,7 @@ class HistoryView(QWidget):
         super(HistoryView, self).__init__(*args, **kwargs)
         #self.setSizePolicy(QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding))
         self.db = db
+        self.connections = db_connection.get_manager(self.db)
         self.setProperty('id', 'history-view')
         self.layout = QGridLayout(self)
         control_container = QWidget()
@@ -81,6 +105,7 @@ class HistoryView(QWidget):
         self.date_entry.setSizePolicy(QSizePolicy(0, 0))
 
         self.view_container = QWidget()
+        self.view_container.setStyleSheet(RATING_STYLES)
         self.view_stack = QStackedLayout(self.view_container)
         self.week_view = QWidget()
         self.week_layout = QHBoxLayout(self.week_view)
@@ -96,6 +121,19 @@ class HistoryView(QWidget):
         self.week_layout.setAlignment(Qt.AlignTop)
         self.month_layout.setAlignment(Qt.AlignCenter)
 
+        # The blocks are made once and show whichever days are selected
+        self.week_blocks = [DayBlock("Weekly") for _ in range(7)]
+        for block in self.week_blocks:
+            self.week_layout.addWidget(block)
+        self.month_blocks = [DayBlock("Monthly", self.month_view) for _ in range(31)]
+        # (row, column) of each of the month_blocks in the month_layout
+        self.month_cells = [None] * len(self.month_blocks)
+
+        # (view type, ISO start day): {ISO day: daily_summary row}
+        # Cleared whenever the change counter says the database changed
+        self.periods = OrderedDict()
+        self.periods_changes = None
+
         self.view_stack.addWidget(self.week_view)
         self.view_stack.addWidget(self.month_view)
 
@@ -135,73 +173,71 @@ class HistoryView(QWidget):
         if self.view_selection.currentText() == "Weekly":
             self.month_view.hide()
             self.view_stack.setCurrentWidget(self.week_view)
-            self.block_layout = self.week_layout
         elif self.view_selection.currentText() == "Monthly":
             self.month_view.show()
             self.view_stack.setCurrentWidget(self.month_view)
-            self.block_layout = self.month_layout
         self.load_blocks()
 
-    def clear_container(self):
-        """Same algorithm to clear a layout as in ScheduleArea.clear_view"""
-        for i in reversed(range(self.block_layout.count())):
-            if not isinstance(self.block_layout.itemAt(i).widget(), QLabel):
-                self.block_layout.itemAt(i).widget().setParent(None)
+    def get_summaries(self, view_type, start_day, end_day):
+        """ The daily_summary rows of a period by ISO day, only read the first time it is shown """
+        con = self.connections.reader()
+        changes = db_interface.get_change_counter(con)
+        if changes != self.periods_changes:
+            self.periods.clear()
+            self.periods_changes = changes
+        key = (view_type, start_day.toString(Qt.ISODate))
+        summaries = self.periods.get(key)
+        if summaries is None:
+            # One row per day that has plans or a rating
+            summaries = {
+                row["day"]: row
+                for row in db_interface.get_daily_summaries(con, start_day, end_day)
+            }
+            self.periods[key] = summaries
+            while len(self.periods) > PERIOD_CACHE_SIZE:
+                self.periods.popitem(last=False)
+        self.periods.move_to_end(key)
+        return summaries
 
     def load_blocks(self):
-        self.clear_container()
         start_day = self.date_entry.date()
         view_type = self.view_selection.currentText()
-        # defaultdict would work here too, but I need to run
-        # a loop to initialize a key for each day in the week
-        # anyway
-        week = {}
         if view_type == "Weekly":
             num_days = 7
         else:
             month_range = monthrange(start_day.year(), start_day.month())
             start_day = QDate(start_day.year(), start_day.month(), 1)
             num_days = month_range[1]
+        end_day = start_day.addDays(num_days - 1)
 
-        for i in range(num_days):
-            end_day = start_day.addDays(i)
-            week[end_day] = []
-        with sqlite3.connect(self.db) as con:
-            con.row_factory = sqlite3.Row
-            rows = db_interface.get_schedule(con, start_day, end_day)
-            for row in rows:
-                day = QDate.fromString(row["start"], Qt.ISODate)
-                week[day].append(row)
-            blocks = []
-            for day, plans in week.items():
-                rating = db_interface.get_rating_by_date(con, day)
-                data = enumerate_day(plans)
-                block = DayBlock(view_type, day, rating, *data)
-                blocks.append(block)
-        self.display_blocks(start_day, blocks)
-
-    def display_blocks(self, start_day, blocks):
-        if self.view_selection.currentText() == "Weekly":
-            for block in blocks:
-                self.block_layout.addWidget(block)
-        else:
-            start_col = start_day.dayOfWeek() % 7
-            for count, block in enumerate(blocks, start=start_col):
-                row = (count // 7) + 1
-                column = count % 7
-                self.block_layout.addWidget(block, row, column)
-                self.block_layout.setAlignment(block, Qt.AlignTop)
-
-
-def enumerate_day(rows):
-    num_tasks = 0
-    completed_tasks = 0
-    for row in rows:
-        if row['item_type'] == 0:
-            num_tasks += 1
-            if row['completed'] == True:
-                completed_tasks += 1
-    return num_tasks, completed_tasks
+        summaries = self.get_summaries(view_type, start_day, end_day)
+        blocks = self.week_blocks if view_type == "Weekly" else self.month_blocks[:num_days]
+        for i, block in enumerate(blocks):
+            day = start_day.addDays(i)
+            summary = summaries.get(day.toString(Qt.ISODate))
+            if summary is None:
+                block.set_day(day, None, 0, 0)
+            else:
+                block.set_day(day, summary["rating"], summary["total_tasks"], summary["completed_tasks"])
+        if view_type == "Monthly":
+            self.display_month(start_day, num_days)
+
+    def display_month(self, start_day, num_days):
+        """ Put the month_blocks in the grid, only the ones that are not already in the right cell are moved """
+        start_col = start_day.dayOfWeek() % 7
+        for i, block in enumerate(self.month_blocks[:num_days]):
+            count = start_col + i
+            row = (count // 7) + 1
+            column = count % 7
+            if self.month_cells[i] != (row, column):
+                self.month_layout.removeWidget(block)
+                self.month_layout.addWidget(block, row, column)
+                self.month_layout.setAlignment(block, Qt.AlignTop)
+                self.month_cells[i] = (row, column)
+            if block.isHidden():
+                block.show()
+        for block in self.month_blocks[num_days:]:
+            block.hide()
 
 
 def main():
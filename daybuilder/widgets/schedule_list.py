@@ -0,0 +1,222 @@
+"""
+    Model / view version of the schedule for days with too many items
+    to give each one its own ScheduleItem widget.
+
+    ScheduleModel holds the rows of one day in the same order the
+    ScheduleArea shows them. ScheduleDelegate paints each row as text
+    and only builds a ScheduleItem as the editor for the row that is
+    being edited, so a row that is not on screen costs nothing but its
+    entry in the model.
+"""
+from daybuilder.utils import db_interface, layout
+from daybuilder.widgets import scheduleitem
+
+from PyQt5.QtCore import QAbstractListModel, QDateTime, QModelIndex, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyleOptionViewItem, QAbstractItemView
+
+# Pixels each level of nesting is indented by
+INDENT = 24
+TIMEFRAME_COLOR = "#2e2e48"
+
+
+class ScheduleModel(QAbstractListModel):
+    """
+        List model over the schedule rows of one day.
+        Tasks within a timeframe come right after it, with a depth of 1.
+    """
+    # The sqlite3.Row of an index
+    RowRole = Qt.UserRole
+    # How many items it is nested inside of
+    DepthRole = Qt.UserRole + 1
+
+    # active_id, completed
+    completion_changed = pyqtSignal(int, bool)
+
+    def __init__(self, *args, **kwargs):
+        super(ScheduleModel, self).__init__(*args, **kwargs)
+        # active_id: row
+        self.rows = {}
+        # (active_id, depth) in display order
+        self.order = []
+        # active_id: position in self.order
+        self.positions = {}
+
+    def arrange(self):
+        intervals = []
+        for active_id, row in self.rows.items():
+            start = layout.minutes(row['start'])
+            intervals.append(layout.Interval(active_id, row['item_type'], start, start + row['duration']))
+        self.order = []
+        for placement in layout.nest(intervals):
+            self.order.append((placement.key, 0))
+            self.order.extend((child, 1) for child in placement.children)
+        self.positions = {active_id: position for position, (active_id, _) in enumerate(self.order)}
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = {row['active_id']: row for row in rows}
+        self.arrange()
+        self.endResetModel()
+
+    def rearrange(self):
+        """ Put the rows back in order after times change, keeping the view's place """
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_ids = [self.order[index.row()][0] for index in old_indexes]
+        self.arrange()
+        new_indexes = [self.index(self.positions[active_id]) for active_id in old_ids]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def update_row(self, row):
+        active_id = row['active_id']
+        old_row = self.rows[active_id]
+        self.rows[active_id] = row
+        if old_row['start'] != row['start'] or old_row['duration'] != row['duration']:
+            self.rearrange()
+        else:
+            index = self.index(self.positions[active_id])
+            self.dataChanged.emit(index, index)
+
+    def remove(self, active_id):
+        position = self.positions[active_id]
+        was_timeframe = self.rows[active_id]['item_type'] == layout.TIMEFRAME
+        self.beginRemoveRows(QModelIndex(), position, position)
+        # Only the one row goes, nothing else moves until rearrange
+        del self.rows[active_id]
+        del self.order[position]
+        self.positions = {active_id: position for position, (active_id, _) in enumerate(self.order)}
+        self.endRemoveRows()
+        if was_timeframe:
+            # Its tasks are not nested any more and may go somewhere else
+            self.rearrange()
+
+    def sync(self, rows):
+        """ Bring the model up to date with the rows of the day """
+        if {row['active_id'] for row in rows} != set(self.rows):
+            self.set_rows(rows)
+            return
+        for row in rows:
+            if not db_interface.same_row(self.rows[row['active_id']], row):
+                self.update_row(row)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.order)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        active_id, depth = self.order[index.row()]
+        row = self.rows[active_id]
+        if role == Qt.DisplayRole:
+            start = QDateTime.fromString(row['start'], Qt.ISODate).time()
+            end = start.addSecs(row['duration'] * 60)
+            times = f"{start.toString(scheduleitem.TIME_FORMAT)} - {end.toString(scheduleitem.TIME_FORMAT)}"
+            description = (row['description'] or "").split("\n", 1)[0]
+            return f"{row['item_name']}\n{times}    {description}"
+        elif role == Qt.CheckStateRole and row['item_type'] == layout.TASK:
+            return Qt.Checked if row['completed'] else Qt.Unchecked
+        elif role == Qt.BackgroundRole and row['item_type'] == layout.TIMEFRAME:
+            return QBrush(QColor(TIMEFRAME_COLOR))
+        elif role == self.RowRole:
+            return row
+        elif role == self.DepthRole:
+            return depth
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+        if index.isValid() and self.rows[self.order[index.row()][0]]['item_type'] == layout.TASK:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        """ The model only changes once the database has, see update_row """
+        if role == Qt.CheckStateRole:
+            self.completion_changed.emit(self.order[index.row()][0], value == Qt.Checked)
+            return True
+        return False
+
+
+class ScheduleDelegate(QStyledItemDelegate):
+    """
+        Paints rows of a ScheduleModel as two lines of text, indented by
+        their depth. The editor is a ScheduleItem in edit mode and its
+        signals are passed on so the ScheduleArea can handle them like
+        the ones from its own widgets.
+    """
+    updated = pyqtSignal(tuple)
+    deleted = pyqtSignal(int)
+
+    def __init__(self, *args, **kwargs):
+        super(ScheduleDelegate, self).__init__(*args, **kwargs)
+        self.editor = None
+        self.editor_row = None
+
+    def paint(self, painter, option, index):
+        option = QStyleOptionViewItem(option)
+        option.rect.adjust(INDENT * index.data(ScheduleModel.DepthRole), 0, 0, 0)
+        super().paint(painter, option, index)
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        if self.editor is not None and index.row() == self.editor_row:
+            # The row opens up to fit the editor
+            return QSize(size.width(), max(size.height(), self.editor.sizeHint().height()))
+        return size
+
+    def createEditor(self, parent, option, index):
+        editor = scheduleitem.create_schedule_item(index.data(ScheduleModel.RowRole))
+        editor.setParent(parent)
+        editor.setAutoFillBackground(True)
+        editor.start_editing()
+        editor.updated.connect(lambda args: self.finish(editor, self.updated, args))
+        editor.deleted.connect(lambda active_id: self.finish(editor, self.deleted, active_id))
+        editor.cancel_button.clicked.connect(lambda: self.closeEditor.emit(editor))
+        if isinstance(editor, scheduleitem.Task):
+            # Checking it off goes the same way as checking off the row, through setData's signal
+            editor.completion_changed.connect(index.model().completion_changed)
+        self.editor = editor
+        self.editor_row = index.row()
+        self.sizeHintChanged.emit(index)
+        return editor
+
+    def finish(self, editor, signal, value):
+        # Close the editor before the ScheduleArea changes the model
+        self.closeEditor.emit(editor)
+        signal.emit(value)
+
+    def destroyEditor(self, editor, index):
+        self.editor = None
+        self.editor_row = None
+        super().destroyEditor(editor, index)
+        self.sizeHintChanged.emit(index)
+
+    def updateEditorGeometry(self, editor, option, index):
+        rect = option.rect.adjusted(INDENT * index.data(ScheduleModel.DepthRole), 0, 0, 0)
+        editor.setGeometry(rect)
+
+    def setEditorData(self, editor, index):
+        # The ScheduleItem already shows its row
+        pass
+
+    def setModelData(self, editor, model, index):
+        # Changes are saved through the updated signal instead
+        pass
+
+
+class ScheduleList(QListView):
+    """ QListView set up for a ScheduleModel and ScheduleDelegate """
+
+    def __init__(self, *args, **kwargs):
+        super(ScheduleList, self).__init__(*args, **kwargs)
+        self.schedule_model = ScheduleModel(self)
+        self.delegate = ScheduleDelegate(self)
+        self.setModel(self.schedule_model)
+        self.setItemDelegate(self.delegate)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
@@ -7,6 +7,7 @@
     Try to make it easy to maintain.
     Try to make it easy to modify.
 """
+from collections import defaultdict
 from typing import Optional
 import sqlite3
 from daybuilder.utils import util
@@ -216,6 +217,13 @@ class ScheduleItem(QWidget):
         self.end_time_edit.setTime(self.end_time)
         self.description_edit.setPlainText(self.description)
 
+    def bind(self, row:sqlite3.Row):
+        """ Show a different row in this widget, used by ItemPool to reuse widgets """
+        self.init_data(row)
+        self.name_label.setText(self.name)
+        self.refresh_view()
+        self.stop_editing()
+
     def update_data(self, start:str, duration:int, description:str, completed:Optional[bool]):
         self.day = start.date()
         self.start_time = start.time()
@@ -242,7 +250,7 @@ class ScheduleItem(QWidget):
 
             Return Values:
                 -2: self takes place within schedule_item
-                    self.start > schedule_item.start AND self.end <= schedule_item.end
+                    self.start >= schedule_item.start AND self.end <= schedule_item.end
 
                 -1: self ends during schedule_item (schedule_item starts during self)
                     self.start < schedule_item.start
@@ -258,24 +266,30 @@ class ScheduleItem(QWidget):
                         AND self.end > schedule_item.end
 
                 2: schedule_item takes place within self
-                    self.start < schedule_item.start AND self.end >= schedule_item.end
+                    self.start <= schedule_item.start AND self.end >= schedule_item.end
+
+            Items with the exact same times return 0.
         """
         # NOTE: I can't help but feel like there is a better way to do this.
         #       Maybe I'll come back and try to simplify it.
             # For now items w/ identical times just return 0 to say they should not be nested
-        if self.start == schedule_item.start and self.end == schedule_item.end:
+        start, end = self.start_time, self.end_time
+        other_start, other_end = schedule_item.start_time, schedule_item.end_time
+        if start == other_start and end == other_end:
             return 0
-        if self.start > schedule_item.start:
-            if self.end <= schedule_item.end:
+        if start == other_start:
+            return 2 if end > other_end else -2
+        if start > other_start:
+            if end <= other_end:
                 return -2
-            elif self.start < schedule_item.end:
+            elif start < other_end:
                 return -1
             else:
                 return 0
-        elif self.start < schedule_item.start:
-            if self.end >= schedule_item.end:
+        else:
+            if end >= other_end:
                 return 2
-            elif self.end > schedule_item.start:
+            elif end > other_start:
                 return 1
             else:
                 return 0
@@ -286,13 +300,15 @@ class NestingItem(ScheduleItem):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.children = []
+        # Not called children so it does not hide QObject.children
+        self.child_items = []
 
     def init_ui(self):
         super().init_ui()
 
         self.child_container = QWidget()
         self.child_vbox = QVBoxLayout(self.child_container)
+        self.child_container.hide()
 
         self.vbox.addWidget(self.child_container)
 
@@ -301,25 +317,33 @@ class NestingItem(ScheduleItem):
         if self.time_overlap(new_child) != 2:
             raise ValueError("Child ScheduleItem must have start_time after parent's start_time and end_time before parent's end_time")
         insertion_index = None
-        for child in sorted(self.children, key=lambda c: c.start_time):
+        for child in self.child_items:
             if new_child.start_time < child.start_time:
-                insertion_index = self.children_vbox.indexOf(child)
+                insertion_index = self.child_items.index(child)
                 break
         if insertion_index is None:
-            self.children_vbox.addWidget(new_child)
-        else:
-            self.children_vbox.insertWidget(insertion_index, new_child)
+            insertion_index = len(self.child_items)
+        self.insert_child(insertion_index, new_child)
+
+    def insert_child(self, index, new_child):
+        """ Put a child at an index without checking its times,
+            for when the caller already knows where it goes """
+        self.child_vbox.insertWidget(index, new_child)
+        self.child_items.insert(index, new_child)
         new_child.parent_item = self
-        self.children.append(new_child)
+        self.child_container.show()
 
     def remove_child(self, child):
         self.child_vbox.removeWidget(child)
-        self.children.remove(child)
+        self.child_items.remove(child)
         child.parent_item = None
+        if not self.child_items:
+            self.child_container.hide()
 
 
-class TimeFrame(ScheduleItem):
-    """ A note is something you would like to see in your daily plan, such as a reminder """
+class TimeFrame(NestingItem):
+    """ A note is something you would like to see in your daily plan, such as a reminder.
+        Tasks that take place during a TimeFrame are shown inside of it. """
     item_type = 1
 
     def __init__(self, *args, **kwargs):
@@ -329,18 +353,32 @@ class Task(ScheduleItem):
     """ A Task is something you want to do that has a definite complete state """
     item_type = 0
 
+    # Emits the active_id and whether it was checked.
+    # Checking a task off only changes completed, so it does not need all of updated's arguments
+    completion_changed = pyqtSignal(int, bool)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.completed = False
 
     def init_name(self):
         self.name_label = QCheckBox(self.name)
         self.name_label.setChecked(self.completed)
         self.name_label.clicked.connect(self.marked_complete)
 
+    def bind(self, row):
+        super().bind(row)
+        self.name_label.setChecked(self.completed)
+
+    def update_data(self, start, duration, description, completed):
+        super().update_data(start, duration, description, completed)
+        self.set_completed(completed)
+
+    def set_completed(self, completed):
+        self.completed = bool(completed)
+        self.name_label.setChecked(self.completed)
+
     def marked_complete(self, complete):
-        self.completed = complete
-        self.save_changes()
+        self.completion_changed.emit(self.id, complete)
 
 class Activity(NestingItem, Task):
     """ Basically a task that can contain nested tasks """
@@ -349,13 +387,79 @@ class Activity(NestingItem, Task):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-def create_schedule_item(row):
+def schedule_item_class(row):
     if row['item_type'] == 0:
-        return Task(row)
+        return Task
     elif row['item_type'] == 1:
-        return TimeFrame(row)
+        return TimeFrame
     else:
-        return ScheduleItem(row)
+        return ScheduleItem
+
+
+def create_schedule_item(row):
+    return schedule_item_class(row)(row)
+
+
+# Most days have fewer items than this, so paging through days can
+# keep reusing the same widgets
+POOL_SIZE = 64
+
+class ItemPool:
+    """
+        Keeps ScheduleItems that are no longer on screen so they can show
+        another row instead of building a new widget with all of its buttons,
+        icons and editors.
+
+        take(row) returns a widget for a row, reused if there is a free one
+        of the right class. A reused widget is still hidden, the caller shows
+        it once it is in its layout. release(item) gives a widget back. Once there
+        are max_size free widgets any more are deleted.
+
+        setup is called with every new widget, for connecting its signals
+        once instead of every time it is reused.
+        parent is the widget free items are kept in, they have to be moved
+        out of other items since those could be deleted.
+    """
+
+    def __init__(self, parent, setup=None, max_size=POOL_SIZE):
+        self.parent = parent
+        self.setup = setup
+        self.max_size = max_size
+        # class: [free items]
+        self.free = defaultdict(list)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def take(self, row):
+        item_class = schedule_item_class(row)
+        free = self.free[item_class]
+        if free:
+            item = free.pop()
+            self.size -= 1
+            self.hits += 1
+            item.bind(row)
+        else:
+            item = item_class(row)
+            self.misses += 1
+            if self.setup:
+                self.setup(item)
+        return item
+
+    def release(self, item):
+        if self.size >= self.max_size:
+            item.deleteLater()
+            return
+        item.stop_editing()
+        item.setParent(self.parent)
+        # setParent only hides the widget if its parent changes,
+        # items that were at the top of the schedule already had this one
+        item.hide()
+        self.free[type(item)].append(item)
+        self.size += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": self.size}
 
 
 def main(filename):
@@ -1,8 +1,9 @@
 from calendar import monthrange
 from collections import defaultdict
-from daybuilder.utils import db_interface, stats, util
+from daybuilder.utils import db_connection, db_interface, stats, util
 import datetime
-from PyQt5.QtCore import Qt, QDate
+import math
+from PyQt5.QtCore import Qt, QDate, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QBrush, QPalette, QPainter, QColor
 from PyQt5.QtWidgets import (
     QWidget,
@@ -27,6 +28,76 @@ from PyQt5.QtWidgets import (
 import sqlite3
 import sys
 
+# Ranges of days the stats can be calculated from
+# name: number of days up to today, None for all of them
+STAT_RANGES = {
+    "All time": None,
+    "Last 30 days": 30,
+    "Last 90 days": 90,
+    "Last year": 365,
+}
+
+
+class StatsSignals(QObject):
+    # request number, {"aggregates": ..., "cube": ..., "trends": ..., "correlations": ...}, engine version
+    finished = pyqtSignal(int, object, int)
+    # request number, error message
+    failed = pyqtSignal(int, str)
+
+
+class StatsWorker(QRunnable):
+    """ Gets the stats from the StatsEngine on a thread from the pool
+        so the window does not freeze while the database is read """
+
+    def __init__(self, number, stats_engine, start_date, end_date):
+        super(StatsWorker, self).__init__()
+        self.number = number
+        self.stats_engine = stats_engine
+        self.start_date = start_date
+        self.end_date = end_date
+        self.cancelled = False
+        self.signals = StatsSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+        try:
+            self.load()
+        finally:
+            # The pool may retire this thread, which would leave its connection open
+            db_connection.get_manager(self.stats_engine.database).release_reader()
+
+    def load(self):
+        if self.cancelled:
+            return
+        try:
+            aggregates, arrays, fingerprint = self.stats_engine.get_stats(
+                self.start_date, self.end_date, self.is_cancelled
+            )
+            results = {"aggregates": aggregates}
+            database = self.stats_engine.database
+            # The engine keeps the arrays up to date with every change, so
+            # whatever is not cached is built from them without reading the database
+            for name, load in (
+                ("cube", stats.load_cube),
+                ("trends", stats.load_trends),
+                ("correlations", stats.load_correlations),
+            ):
+                if self.cancelled:
+                    return
+                results[name] = load(database, self.start_date, self.end_date, fingerprint, arrays)
+        # An exception that leaves run() takes the whole program down
+        except Exception as error:
+            if not self.cancelled:
+                self.signals.failed.emit(self.number, str(error))
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(self.number, results, self.stats_engine.version)
+
 
 class BarGraph(QWidget):
     def __init__(self, *args, **kwargs):
@@ -44,15 +115,40 @@ class StatsView(QWidget):
     def __init__(self, db, *args, **kwargs):
         super(StatsView, self).__init__(*args, **kwargs)
         self.db = db
-        self.stack = QStackedLayout(self)
+        self.vbox = QVBoxLayout(self)
+        self.stack_container = QWidget()
+        self.stack = QStackedLayout(self.stack_container)
         self.stats_container = QWidget()
         self.grid = QGridLayout(self.stats_container)
-        self.ratings, self.items = None, None
+        self.stats_engine = stats.get_engine(self.db)
+        self.aggregates = None
+        self.cube = None
+        self.trends = None
+        self.correlations = None
+        # Version of the engine's aggregates that is on screen
+        self.displayed_version = None
+        # Stats are loaded by StatsWorkers one at a time.
+        # Only the result of the newest request is displayed.
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.worker = None
+        self.request_number = 0
+
+        # The range selection is outside of the stack so you can still
+        # change it when a range does not have enough data
+        self.range_selection = QComboBox()
+        self.range_selection.addItems(STAT_RANGES.keys())
+        self.range_selection.setSizePolicy(QSizePolicy(0, 0))
+        self.range_selection.currentTextChanged.connect(self.refresh)
 
         self.no_data = QLabel("Not enough data to display statistics.")
         self.no_data.setProperty("font-class", "heading")
         self.no_data.setAlignment(Qt.AlignCenter)
 
+        self.loading = QLabel()
+        self.loading.setProperty("font-class", "heading")
+        self.loading.setAlignment(Qt.AlignCenter)
+
         mainlabel = QLabel("My Stats")
         mainlabel.setProperty("font-class", "title")
 
@@ -100,79 +196,232 @@ class StatsView(QWidget):
         self.grid.addWidget(least_completed_task, 7, 0, 1, 2)
         self.grid.addWidget(self.least_completed, 7, 2, 1, 2)
 
+        # Trends
+        self.trend_labels = {}
+        for column, window in zip((0, 3), stats.TREND_WINDOWS):
+            trend_heading = QLabel(f"Last {window} Days")
+            trend_heading.setProperty("font-class", "heading")
+            trend_label = QLabel()
+            trend_label.setProperty("font-class", "subcontent")
+            trend_label.setAlignment(Qt.AlignCenter)
+            self.trend_labels[window] = trend_label
+            self.grid.addWidget(trend_heading, 8, column, 1, 2, alignment=Qt.AlignCenter)
+            self.grid.addWidget(trend_label, 9, column, 1, 2, alignment=Qt.AlignCenter)
+
+        longest_streak_task = QLabel("Longest Streak:")
+        longest_streak_task.setProperty("font-class", "detail")
+        current_streak_task = QLabel("Current Streak:")
+        current_streak_task.setProperty("font-class", "detail")
+
+        self.longest_streak = QLabel()
+        self.longest_streak.setProperty("font-class", "subcontent")
+        self.current_streak = QLabel()
+        self.current_streak.setProperty("font-class", "subcontent")
+
+        self.grid.addWidget(longest_streak_task, 10, 0, 1, 2)
+        self.grid.addWidget(self.longest_streak, 10, 2, 1, 2)
+        self.grid.addWidget(current_streak_task, 11, 0, 1, 2)
+        self.grid.addWidget(self.current_streak, 11, 2, 1, 2)
+
+        # Correlations
+        best_days_task = QLabel("Best Days Include:")
+        best_days_task.setProperty("font-class", "detail")
+        worst_days_task = QLabel("Worst Days Include:")
+        worst_days_task.setProperty("font-class", "detail")
+
+        self.best_days = QLabel()
+        self.best_days.setProperty("font-class", "subcontent")
+        self.worst_days = QLabel()
+        self.worst_days.setProperty("font-class", "subcontent")
+
+        self.grid.addWidget(best_days_task, 12, 0, 1, 2)
+        self.grid.addWidget(self.best_days, 12, 2, 1, 2)
+        self.grid.addWidget(worst_days_task, 13, 0, 1, 2)
+        self.grid.addWidget(self.worst_days, 13, 2, 1, 2)
+
+        # Weekdays
+        weekday_label = QLabel("By Weekday")
+        weekday_label.setProperty("font-class", "heading")
+        self.weekday_container = QWidget()
+        self.weekday_grid = QGridLayout(self.weekday_container)
+        for column, heading in enumerate(("", "Average Rating", "Tasks", "Completed")):
+            weekday_heading = QLabel(heading)
+            weekday_heading.setProperty("font-class", "detail")
+            self.weekday_grid.addWidget(weekday_heading, 0, column, alignment=Qt.AlignCenter)
+        # One row of labels per weekday, Monday first like the cube
+        self.weekday_labels = []
+        for weekday in range(7):
+            # weekday_map starts at Sunday
+            day_label = QLabel(util.weekday_map[(weekday + 1) % 7])
+            day_label.setProperty("font-class", "detail")
+            self.weekday_grid.addWidget(day_label, weekday + 1, 0)
+            labels = []
+            for column in range(1, 4):
+                value_label = QLabel()
+                value_label.setProperty("font-class", "subcontent")
+                self.weekday_grid.addWidget(value_label, weekday + 1, column, alignment=Qt.AlignCenter)
+                labels.append(value_label)
+            self.weekday_labels.append(labels)
+
+        self.grid.addWidget(weekday_label, 14, 0, 1, 5, alignment=Qt.AlignCenter)
+        self.grid.addWidget(self.weekday_container, 15, 0, 1, 5)
+
         self.grid.setAlignment(Qt.AlignCenter)
 
         self.stack.addWidget(self.no_data)
+        self.stack.addWidget(self.loading)
         self.stack.addWidget(self.stats_container)
         self.stack.setAlignment(Qt.AlignCenter)
+        self.vbox.addWidget(self.range_selection, alignment=Qt.AlignRight)
+        self.vbox.addWidget(self.stack_container)
         self.refresh()
 
     def display_stats(self):
-        if self.ratings.empty or self.items.empty:
+        if self.aggregates.is_empty():
             self.stack.setCurrentWidget(self.no_data)
         else:
             self.stack.setCurrentWidget(self.stats_container)
             self.display_overall_stats()
             self.display_task_stats()
+            self.display_trend_stats()
+            self.display_correlation_stats()
+            self.display_weekday_stats()
 
-    def get_data(self):
-        self.ratings, self.items = stats.load_data(self.db)
+    def date_range(self):
+        """ The oldest and newest QDate of the selected range, None for no limit """
+        days = STAT_RANGES[self.range_selection.currentText()]
+        if days is None:
+            return None, None
+        today = QDate.currentDate()
+        return today.addDays(1 - days), today
 
     def display_overall_stats(self):
-        avg_rating = self.ratings.rating.mean()
+        avg_rating = self.aggregates.average_rating()
         # TODO : can make this more descriptive by
         # treating a number like 2.5 as being a mix of "Bad" and "Okay"
         # instead of just rounding
         avg_rating_word = util.rating_value_map[round(avg_rating)]
         self.overall_rating.setText(f"{avg_rating:.2} ({avg_rating_word})")
-        rating_counts = self.ratings.rating.value_counts()
-        try:
-            task_completion = (
-                self.items["completed"].value_counts(normalize=True)[True] * 100
-            )
-            self.overall_completion.setText(f"{round(task_completion, 2)}%")
-        except KeyError:
-            self.overall_completion.setText("0%")
+        task_completion = self.aggregates.task_completion() * 100
+        self.overall_completion.setText(f"{round(task_completion, 2)}%")
 
     def display_task_stats(self):
-        # NOTE there has to be a better way to do this
-        tasks = self.items[self.items.item_type == 0]
-        task_counts = tasks.item_name.value_counts()
-        self.most_common.setText(task_counts.index[0])
-
-        comp_rates = tasks.groupby("item_name").completed.value_counts(normalize=True)
-        try:
-            comp_rates_true = comp_rates[
-                comp_rates.index.get_level_values("completed").isin([True])
-            ].sort_values()
-
-            worst_name, worst_rate = (
-                comp_rates_true.head(1).index[0][0],
-                comp_rates_true.head(1)[0],
-            )
-            best_name, best_rate = (
-                comp_rates_true.tail(1).index[0][0],
-                comp_rates_true.tail(1)[0],
-            )
+        names = self.cube.names
+        most_common = self.cube.most_common(item_type=0)
+        if most_common is not None:
+            self.most_common.setText(names[most_common])
+        else:
+            self.most_common.setText("No tasks have been planned")
 
-            self.most_completed.setText(f"{best_name} ({round(best_rate * 100)}%)")
-            self.least_completed.setText(f"{worst_name} ({round(worst_rate * 100)}%)")
-        except Exception:
+        codes, rates = self.cube.completion_rates(item_type=0)
+        if len(codes):
+            self.most_completed.setText(f"{names[codes[-1]]} ({round(rates[-1] * 100)}%)")
+            self.least_completed.setText(f"{names[codes[0]]} ({round(rates[0] * 100)}%)")
+        else:
             self.most_completed.setText("No tasks have been completed")
             self.least_completed.setText("No tasks have been completed")
 
-    # Currently not in use
+    def display_trend_stats(self):
+        for window, trend_label in self.trend_labels.items():
+            completion = self.trends["completion"][window][-1]
+            rating = self.trends["rating"][window][-1]
+            lines = []
+            if math.isnan(completion):
+                lines.append("No tasks were planned")
+            else:
+                lines.append(f"{round(completion * 100)}% of tasks completed")
+            if math.isnan(rating):
+                lines.append("No days were rated")
+            else:
+                lines.append(f"Average rating {rating:.2}")
+            trend_label.setText("\n".join(lines))
+
+        names = self.trends["names"]
+        for streaks, streak_label in (
+            (self.trends["longest_streak"], self.longest_streak),
+            (self.trends["current_streak"], self.current_streak),
+        ):
+            best = streaks.argmax() if len(streaks) else None
+            if best is None or streaks[best] == 0:
+                streak_label.setText("No tasks have been completed")
+            else:
+                streak_label.setText(f"{names[best]} ({streaks[best]} days)")
+
+    def display_correlation_stats(self):
+        """ The items whose days are rated furthest above and below the rest """
+        ranked = stats.top_lifts(self.correlations)
+        names = self.correlations["names"]
+        lift = self.correlations["lift"]
+        if len(ranked) == 0:
+            self.best_days.setText("Not enough rated days")
+            self.worst_days.setText("Not enough rated days")
+            return
+        best, worst = ranked[0], ranked[-1]
+        if lift[best] > 0:
+            self.best_days.setText(f"{names[best]} ({lift[best]:+.2} rating)")
+        else:
+            self.best_days.setText("Nothing stands out")
+        if lift[worst] < 0:
+            self.worst_days.setText(f"{names[worst]} ({lift[worst]:+.2} rating)")
+        else:
+            self.worst_days.setText("Nothing stands out")
+
     def display_weekday_stats(self):
-        weekday_ratings = self.ratings.groupby(by=self.ratings.date.dt.weekday)
-        for name, group in weekday_ratings:
-            day_index = (name + 1) % 7
-            print(f" Name = {name}, Day = {util.weekday_map[day_index]}")
-            print(group.rating.value_counts())
-            print(group.rating.agg(["count", "mean"]))
+        """ The average rating and task completion of each weekday """
+        mean_ratings = self.cube.weekday_mean_ratings()
+        tasks = self.cube.summary("weekday", item_type=0)
+        for weekday, (rating_label, tasks_label, completion_label) in enumerate(self.weekday_labels):
+            rating = mean_ratings[weekday]
+            completion = tasks["completion_rate"][weekday]
+            rating_label.setText("N/A" if math.isnan(rating) else f"{rating:.2}")
+            tasks_label.setText(str(tasks["count"][weekday]))
+            completion_label.setText("N/A" if math.isnan(completion) else f"{round(completion * 100)}%")
 
     def refresh(self):
-        self.get_data()
+        """ Start loading the stats in the background. A request that is
+            still running is cancelled since its result would be replaced anyway """
+        self.cancel()
+        self.request_number += 1
+        start_date, end_date = self.date_range()
+        # Keep the old stats on screen while they are updated,
+        # unless they are for a different range
+        if (
+            self.aggregates is None
+            or self.aggregates.start_date != start_date
+            or self.aggregates.end_date != end_date
+        ):
+            self.loading.setText("Loading statistics...")
+            self.stack.setCurrentWidget(self.loading)
+        self.worker = StatsWorker(self.request_number, self.stats_engine, start_date, end_date)
+        self.worker.signals.finished.connect(self.show_result)
+        self.worker.signals.failed.connect(self.show_error)
+        self.pool.start(self.worker)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    def show_result(self, number, results, version):
+        if number != self.request_number:
+            return
+        self.worker = None
+        self.aggregates = results["aggregates"]
+        self.cube = results["cube"]
+        self.trends = results["trends"]
+        self.correlations = results["correlations"]
+        # Nothing changed since the last time the stats were displayed
+        if self.displayed_version == version and self.stack.currentWidget() is not self.loading:
+            return
         self.display_stats()
+        self.displayed_version = version
+
+    def show_error(self, number, message):
+        if number != self.request_number:
+            return
+        self.worker = None
+        self.loading.setText(f"Could not load statistics.\n{message}")
+        self.stack.setCurrentWidget(self.loading)
 
 
 def main():